@@ -0,0 +1,152 @@
+import os
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from text_vectors import TOKEN_PATTERN, STOPWORDS, feature_index
+
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "500"))  # réponses gardées en mémoire, tous tickers
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.8"))  # similarité cosinus minimale
+BIGRAM_WEIGHT = 0.5  # les paires de mots gardent l'ordre sans trop pénaliser les reformulations
+
+# Mots des questions qui ne changent pas leur sens
+QUESTION_WORDS = frozenset("""
+what what's whats who how why when where which do does did can could should would is are please tell me about
+quel quelle quels quelles qui quoi comment pourquoi quand est ce peux tu dis moi svp
+""".split())
+# Négations et comparatifs : ils changent le sens de la question, ils sont gardés et doivent concorder
+NEGATIONS = frozenset("""
+not no never none nor without cannot isn aren doesn don didn wasn won shouldn couldn wouldn
+n ne pas jamais aucun aucune sans ni
+""".split())
+COMPARATIVES = frozenset("""
+more less than higher lower greater fewer larger smaller bigger better worse above below exceed exceeds
+outperform underperform vs versus plus moins superieur superieure inferieur inferieure meilleur meilleure pire mieux
+""".split())
+# "sur" : "sûr" une fois les accents retirés
+QUESTION_STOPWORDS = (STOPWORDS | QUESTION_WORDS) - NEGATIONS - COMPARATIVES - {"sur"}
+
+
+def normalize(question):
+    """Minuscules, sans accents, sans ponctuation ni mots vides ; l'ordre des mots est conservé."""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char)).replace("'", " ").replace("’", " ")
+    tokens = [
+        token for token in TOKEN_PATTERN.findall(text)
+        if token not in QUESTION_STOPWORDS and (len(token) > 1 or token in NEGATIONS)
+    ]
+    return " ".join(tokens)
+
+
+def markers(normalized):
+    """Négations et comparatifs avec leurs voisins : "debt higher than equity" ne vaut pas l'inverse."""
+    tokens = normalized.split()
+    return tuple(
+        tuple(tokens[max(position - 1, 0):position + 2])
+        for position, token in enumerate(tokens)
+        if token in NEGATIONS or token in COMPARATIVES
+    )
+
+
+def embed(normalized):
+    """Vecteur creux normalisé des mots et des paires de mots consécutifs."""
+    tokens = normalized.split()
+    weights = {}
+    features = [(token, 1.0) for token in tokens] + [(f"{a} {b}", BIGRAM_WEIGHT) for a, b in zip(tokens, tokens[1:])]
+    for feature, weight in features:
+        index, sign = feature_index(feature)
+        weights[index] = weights.get(index, 0.0) + sign * weight
+    weights = {index: value for index, value in weights.items() if value}
+    if not weights:
+        return None
+    indices = np.fromiter(sorted(weights), dtype=np.int32, count=len(weights))
+    values = np.array([weights[index] for index in indices], dtype=np.float32)
+    return indices, values / np.linalg.norm(values)
+
+
+def similarity(a, b):
+    common, a_positions, b_positions = np.intersect1d(a[0], b[0], assume_unique=True, return_indices=True)
+    return float(np.dot(a[1][a_positions], b[1][b_positions])) if len(common) else 0.0
+
+
+class SemanticAnswerCache:
+    """
+    Réponses du chat par ticker, retrouvées pour une question proche (similarité
+    cosinus >= threshold, mêmes négations et comparatifs) pendant ttl secondes. Borné à max_entries réponses : la
+    moins récemment utilisée est retirée en premier.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (ticker, question normalisée) -> entrée
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, ticker, question):
+        """
+        Réponse déjà donnée pour une question proche sur ce ticker.
+
+        Returns:
+            dict: {"answer", "question", "similarity"}, ou None.
+        """
+        normalized = normalize(question)
+        vector = embed(normalized)
+        guard = markers(normalized)
+        now = time.time()
+        with self._lock:
+            best_key, best_score = None, 0.0
+            if vector is not None:
+                for key, entry in list(self._entries.items()):
+                    if now - entry["created"] > self.ttl:
+                        del self._entries[key]
+                        continue
+                    if key[0] != ticker or entry["markers"] != guard:
+                        continue
+                    score = 1.0 if key[1] == normalized else similarity(vector, entry["vector"])
+                    if score > best_score:
+                        best_key, best_score = key, score
+            if best_key is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            return {"answer": entry["answer"], "question": entry["question"], "similarity": best_score}
+
+    def store(self, ticker, question, answer):
+        normalized = normalize(question)
+        vector = embed(normalized)
+        if vector is None or not answer:
+            return
+        with self._lock:
+            self._entries[(ticker, normalized)] = {
+                "question": question, "answer": answer, "vector": vector,
+                "markers": markers(normalized), "created": time.time(),
+            }
+            self._entries.move_to_end((ticker, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+            }
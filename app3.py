@@ -9,9 +9,17 @@ import numpy as np
 import plotly.graph_objs as go
 from io import BytesIO
 
-from reportpdf import download_report
+from report_jobs import ReportJobManager, DONE, FAILED
+from macro_digest import start_macro_digest_scheduler
+from price_store import start_price_sync
+import metrics_engine
+import constituents
+from screener import ScreenerIndex, SCREENER_COLUMNS, start_screener_refresh
 from chart_utils import *
-from bedrock_agents import call_agent_with_prompt
+from chat_sessions import ChatSessionManager, FAILED as CHAT_FAILED
+from dashboard_data import prefetch_ticker, load_filings, load_market, load_indicators, load_tables
+import telemetry
+import rate_limit
 
 
 # var d'environnement et des clients AWS
@@ -24,39 +32,177 @@ region_name = os.getenv("AWS_DEFAULT_REGION")
 
 
 
-session_id = str(uuid.uuid4())
+st.set_page_config(layout="wide")
 
 
+# Tâches de fond partagées par toutes les sessions (lancées une seule fois par processus)
+@st.cache_resource
+def start_background_jobs():
+    constituents.start_constituents_refresh()
+    start_macro_digest_scheduler()
+    start_price_sync(fetch_sp500_tickers)
+    metrics_engine.start_metrics_refresh(fetch_sp500_tickers)
+    start_screener_refresh(fetch_sp500_tickers)
+    telemetry.start_telemetry_export()
+    return True
 
-st.set_page_config(layout="wide")
+start_background_jobs()
 
-# Récupérer la liste des tickers du S&P 500
-@st.cache_data
+# Récupérer la liste des tickers du S&P 500 (registre local, sans appel réseau)
 def get_sp500_tickers():
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-    tables = pd.read_html(url)
-    sp500_table = tables[0]
-    tickers = sp500_table["Symbol"].tolist()
-    return tickers
+    return fetch_sp500_tickers()
+
+
+def ticker_label(symbol):
+    constituent = constituents.get_constituent(symbol)
+    return f"{symbol} – {constituent['name']}" if constituent else symbol
+
+
+
+
+
+def format_metric(value, digits):
+    return "N/A" if value is None else round(value, digits)
 
 
+# File de génération des rapports, partagée entre les sessions
+@st.cache_resource
+def get_report_jobs():
+    return ReportJobManager()
 
 
+# Sessions de chat de tous les utilisateurs : une session d'agent par utilisateur,
+# tours servis par un pool partagé (voir chat_sessions)
+@st.cache_resource
+def get_chat_sessions():
+    return ChatSessionManager(agent_alias)
+
+
+if "report_jobs" not in st.session_state:
+    st.session_state.report_jobs = {}  # ticker -> identifiant du job
+
+
+# Avancement du rapport, rafraîchi sans relancer toute la page
+@st.fragment(run_every=2)
+def report_status(ticker):
+    job_id = st.session_state.report_jobs.get(ticker)
+    job = get_report_jobs().get(job_id) if job_id else None
+    if job is None:
+        return
+    if job.status == DONE:
+        st.download_button(
+            label="Télécharger le rapport PDF",
+            data=job.pdf,
+            file_name=f"rapport_{ticker}.pdf",
+            mime="application/pdf"
+        )
+    elif job.status == FAILED:
+        st.error(f"La génération du rapport a échoué : {job.error}")
+    else:
+        st.progress(job.progress, text=f"Rapport {ticker} : {job.status} ({len(job.stages_done)}/{job.total_stages} étapes)")
+
+
+# Index du screener, relu depuis le disque au plus toutes les 5 minutes
+@st.cache_resource(ttl=300)
+def load_screener_index():
+    return ScreenerIndex.load()
+
 
 # Interface utilisateur Streamlit
 st.title("Rapports SEC pour les entreprises du S&P 500")
 
 
+# Screener : filtres et tris sur l'index précalculé, sans appel réseau.
+# Fragment : manipuler les filtres ne relance que cette section
+@st.fragment
+def screener_section():
+    with st.expander("Screener S&P 500"):
+        screener_index = load_screener_index()
+        if screener_index is None:
+            st.write("L'index du screener est en cours de construction.")
+        else:
+            filters = {}
+            filter_columns = st.columns(4)
+            for position, (name, label) in enumerate(SCREENER_COLUMNS.items()):
+                low, high = screener_index.bounds(name)
+                if low is None or low == high:
+                    continue
+                with filter_columns[position % 4]:
+                    selected = st.slider(label, low, high, (low, high), key=f"screener_{name}")
+                # Une colonne n'est filtrée que si l'intervalle a été réduit (les valeurs manquantes restent visibles sinon)
+                if selected != (low, high):
+                    filters[name] = selected
+
+            # Secteurs GICS lus dans le registre des constituants
+            sectors = st.multiselect("Secteurs", sorted(constituents.get_sectors()))
+
+            sort_column, order_column = st.columns(2)
+            with sort_column:
+                sort_by = st.selectbox("Trier par", list(SCREENER_COLUMNS), format_func=SCREENER_COLUMNS.get)
+            with order_column:
+                descending = st.radio("Ordre", ["Décroissant", "Croissant"], horizontal=True) == "Décroissant"
+
+            positions = screener_index.query(filters, sort_by, descending)
+            if sectors:
+                positions = [p for p in positions if constituents.get_sector(str(screener_index.symbols[p])) in sectors]
+            st.caption(f"{len(positions)} entreprises sur {len(screener_index)}")
+            screener_df = pd.DataFrame(screener_index.rows(positions), columns=["symbol"] + list(SCREENER_COLUMNS))
+            screener_df.insert(1, "sector", screener_df["symbol"].map(constituents.get_sector))
+            st.dataframe(screener_df.rename(columns=dict(SCREENER_COLUMNS, sector="Secteur")), hide_index=True)
+
+screener_section()
+
+
+# Diagnostics : traces des derniers rapports (étapes, appels yfinance / Bedrock / articles)
+@st.fragment
+def diagnostics_section():
+    with st.expander("Diagnostics"):
+        traces = telemetry.get_traces()
+        if not traces:
+            st.write("Aucun rapport généré depuis le démarrage.")
+        else:
+            labels = {
+                t.id: f"{t.name} {t.attributes.get('ticker', '')} – "
+                + (f"{t.duration:.1f}s" if t.duration is not None else "en cours")
+                + (" – échec" if t.error else "")
+                for t in traces
+            }
+            by_id = {t.id: t for t in traces}
+            selected_trace = by_id[st.selectbox("Trace", list(labels), format_func=labels.get)]
+            if selected_trace.error:
+                st.error(selected_trace.error)
+            summary = pd.DataFrame.from_dict(selected_trace.summary(), orient="index")
+            st.dataframe(summary.round(3))
+            st.dataframe(pd.DataFrame(selected_trace.rows()), hide_index=True)
+        cache_stats = get_chat_sessions().answer_cache.stats()
+        st.write(
+            f"Cache des réponses du chat : {cache_stats['hit_rate']:.0%} de réponses servies "
+            f"({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}), {cache_stats['entries']} en mémoire"
+        )
+        limiters = rate_limit.limiter_states()
+        if limiters:
+            # Débit adaptatif et disjoncteur de chaque API (voir rate_limit)
+            st.dataframe(pd.DataFrame(limiters), hide_index=True)
+        if st.toggle("Métriques Prometheus"):
+            st.code(telemetry.prometheus_text(), language="text")
+
+diagnostics_section()
+
 
 # Sélection du ticker dans la barre latérale
 with st.sidebar:
     st.header("Sélection du Ticker")
     sp500_tickers = get_sp500_tickers()
-    selected_ticker = st.selectbox("Sélectionnez un ticker du S&P 500 :", sp500_tickers)
+    selected_ticker = st.selectbox("Sélectionnez un ticker du S&P 500 :", sp500_tickers, format_func=ticker_label)
+
+    # Nouveau ticker : données yfinance chargées en parallèle avant l'affichage des sections
+    if selected_ticker and st.session_state.get("prefetched_ticker") != selected_ticker:
+        prefetch_ticker(selected_ticker)
+        st.session_state.prefetched_ticker = selected_ticker
 
     # Obtenir et afficher les rapports pour le ticker sélectionné
     if selected_ticker:
-        dico_10K, dico_8K = get_rapport(selected_ticker)
+        dico_10K, dico_8K = load_filings(selected_ticker)
 
         st.subheader(f"Rapports pour {selected_ticker}")
 
@@ -75,53 +221,50 @@ with st.sidebar:
                 st.write("Aucun rapport 8-K trouvé.")
         
         if st.button("Générer rapport d'analyse"):
-            pdf_buffer = download_report(selected_ticker)
-            st.download_button(
-                label="Télécharger le rapport PDF",
-                data=pdf_buffer,
-                file_name=f"rapport_{selected_ticker}.pdf",
-                mime="application/pdf"
-            )
+            st.session_state.report_jobs[selected_ticker] = get_report_jobs().submit(selected_ticker)
 
+        report_status(selected_ticker)
 
 
 
 
 
-# Initialiser l'historique de la conversation dans la session
-if "conversation" not in st.session_state:
-    st.session_state.conversation = []
 
-with st.container():
+# Identifiant de l'utilisateur (session du navigateur)
+if "chat_user" not in st.session_state:
+    st.session_state.chat_user = str(uuid.uuid4())
+
+
+# Chat : fragment, un message ne relance que cette section (aucun appel yfinance)
+@st.fragment
+def chat_section(selected_ticker):
     # Interface utilisateur Streamlit
     st.title("Chat with our economic expert")
 
     # Champ de saisie pour le message utilisateur
     user_prompt = st.chat_input("Ask about the selected compagny")
 
-    # Vérifier si un message a été entré
+    chat_sessions = get_chat_sessions()
+    # Le tour est mis en file immédiatement ; la réponse arrive depuis le pool
     if user_prompt:
-        # Ajouter le message utilisateur à la conversation
-        st.session_state.conversation.append(("user", user_prompt))
-        
-        # Appeler l'agent avec le prompt utilisateur
+        chat_sessions.submit(st.session_state.chat_user, user_prompt, selected_ticker)
+
+    # Afficher la conversation ; les réponses en cours sont suivies au fil de l'eau
+    for turn in chat_sessions.get_session(st.session_state.chat_user).list_turns():
+        with st.chat_message("user"):
+            st.write(turn.question)
         with st.chat_message("assistant"):
-            st.write("Processing your request...")
-            
-        user_prompt += f" Compagny Ticker ({selected_ticker})."
-        
-        response = call_agent_with_prompt(user_prompt,agent_alias)
-        
-        # Ajouter la réponse de l'agent à la conversation
-        if response:
-            st.session_state.conversation.append(("assistant", response))
-        else:
-            st.session_state.conversation.append(("assistant", "No response received from the agent."))
+            if turn.done:
+                if turn.text:
+                    st.write(turn.text)
+                if turn.cached:
+                    st.caption(f"Réponse en cache (question proche : « {turn.cached['question']} », similarité {turn.cached['similarity']:.0%})")
+            else:
+                st.write_stream(turn.stream())
+            if turn.status == CHAT_FAILED:
+                st.write("No response received from the agent.")
 
-    # Afficher l'historique de la conversation
-    for role, message in st.session_state.conversation:
-        with st.chat_message(role):
-            st.write(message)
+chat_section(selected_ticker)
 
 
 
@@ -143,11 +286,14 @@ with st.container():
 
     # Générer des données pour le portefeuille
     
-    market_dt = market_data(selected_ticker)
-    closing_value=np.array(market_dt)
-    x= np.linspace(0, 20, len(market_dt))
-
-    volume_value=np.array(market_data(selected_ticker, info="Volume"))
+    # Données du ticker lues dans les caches du tableau de bord (voir dashboard_data)
+    market_dt = load_market(selected_ticker)
+    indicators = load_indicators(selected_ticker)
+    tables = load_tables(selected_ticker)
+    closing_value = market_dt["Close"]
+    x= np.linspace(0, 20, len(closing_value))
+
+    volume_value = market_dt["Volume"]
     
     col11, col21 = st.columns(2)
 
@@ -165,7 +311,7 @@ with st.container():
         st.plotly_chart(fig1, use_container_width=True)
 
         # Ajouter une légende pour les résultats simulés
-        st.markdown("<p style='font-size: 18px; margin-top: 20px; font-weight: bold; margin-bottom: -20px;'>RÉSULTATS : DONNÉES SIMULÉES</p>", unsafe_allow_html=True)
+        st.markdown("<p style='font-size: 18px; margin-top: 20px; font-weight: bold; margin-bottom: -20px;'>RÉSULTATS</p>", unsafe_allow_html=True)
 
 
 
@@ -182,21 +328,21 @@ with st.container():
         with col1:
             st.markdown(f"<h3 style='color: {title_color}; margin-bottom: -10px;'>ESG</h3>", unsafe_allow_html=True)  # Réduire l'écart entre le titre et la barre
             st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)  # Ligne séparatrice avec marges ajustées
-            st.markdown(f"<p style='color: {data_color}; font-size: 48px; margin-top: -25px; font-weight: bold;'>{esg_info(selected_ticker)}</p>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: {data_color}; font-size: 48px; margin-top: -25px; font-weight: bold;'>{format_metric(indicators['esg'], 2)}</p>", unsafe_allow_html=True)
 
         # Deuxième colonne (Beta)
         with col2:
             st.markdown(f"<h3 style='color: {'#76496b'}; margin-bottom: -10px;'>BETA</h3>", unsafe_allow_html=True)
             st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)  # Ligne séparatrice avec marges ajustées
-            st.markdown(f"<p style='color: {'#a74c9e'}; font-size: 48px; margin-top: -25px; font-weight: bold;'>{get_beta(selected_ticker)}</p>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: {'#a74c9e'}; font-size: 48px; margin-top: -25px; font-weight: bold;'>{format_metric(indicators['beta'], 2)}</p>", unsafe_allow_html=True)
 
         # Troisième colonne (PS)
         with col3:
             st.markdown(f"<h3 style='color: {'#ebbbc5'}; margin-bottom: -10px;'>PS</h3>", unsafe_allow_html=True)  # Réduire l'écart entre le titre et la barre
             st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)  # Ligne séparatrice avec marges ajustées
-            st.markdown(f"<p style='color: {'#f6c2cf'}; font-size: 48px; margin-top: -25px; font-weight: bold;'>{round(get_latest_ps_ratio(selected_ticker),1)}</p>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: {'#f6c2cf'}; font-size: 48px; margin-top: -25px; font-weight: bold;'>{format_metric(indicators['ps'], 1)}</p>", unsafe_allow_html=True)
 
-        last_dividends_df = get_last_dividends(selected_ticker)
+        last_dividends_df = tables["dividends"]
         if last_dividends_df is not None:
             st.write(f"Les 8 derniers dividendes de {selected_ticker.upper()}:")
             st.table(last_dividends_df)
@@ -228,37 +374,55 @@ with st.container():
         st.plotly_chart(fig2, use_container_width=True)
 
 
-        # Simuler des données pour Return, R-Squared et CAGR
-        return_value = round(np.random.uniform(5, 15), 2)
-        r_squared_value = round(np.random.uniform(0.7, 0.99), 2)
-        cagr_value = round(np.random.uniform(5, 10), 2)
+        # Return, R-Squared (contre le S&P 500) et CAGR sur 2 ans, calculés par le moteur de métriques
+        return_value = format_metric(indicators["return"], 2)
+        r_squared_value = format_metric(indicators["r_squared"], 2)
+        cagr_value = format_metric(indicators["cagr"], 2)
 
-        st.markdown("<p style='font-size: 18px; margin-top: 20px; font-weight: bold; margin-bottom: -20px;'>RÉSULTATS : DONNÉES SIMULÉES</p>", unsafe_allow_html=True)
+        st.markdown("<p style='font-size: 18px; margin-top: 20px; font-weight: bold; margin-bottom: -20px;'>RÉSULTATS</p>", unsafe_allow_html=True)
 
 
         # Créer trois colonnes supplémentaires pour Return, R-Squared, et CAGR
+        col7, col8, col9 = st.columns(3)
+
+        with col7:
+            st.markdown(f"<h3 style='color: {title_color}; margin-bottom: -10px;'>RETURN</h3>", unsafe_allow_html=True)
+            st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: {data_color}; font-size: 48px; margin-top: -25px; font-weight: bold;'>{return_value}</p>", unsafe_allow_html=True)
+
+        with col8:
+            st.markdown(f"<h3 style='color: #76496b; margin-bottom: -10px;'>R²</h3>", unsafe_allow_html=True)
+            st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: #a74c9e; font-size: 48px; margin-top: -25px; font-weight: bold;'>{r_squared_value}</p>", unsafe_allow_html=True)
+
+        with col9:
+            st.markdown(f"<h3 style='color: #ebbbc5; margin-bottom: -10px;'>CAGR</h3>", unsafe_allow_html=True)
+            st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: #f6c2cf; font-size: 48px; margin-top: -25px; font-weight: bold;'>{cagr_value}</p>", unsafe_allow_html=True)
+
+        # Créer trois colonnes supplémentaires pour PE, ROA et ROE
         col4, col5, col6 = st.columns(3)
 
         # Quatrième colonne (PE)
         with col4:
             st.markdown(f"<h3 style='color: #a7f6e0; margin-bottom: -10px;'>PE</h3>", unsafe_allow_html=True)  # Réduire l'écart entre le titre et la barre
             st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)  # Ligne séparatrice avec marges ajustées
-            st.markdown(f"<p style='color: #bcede7; font-size: 48px; margin-top: -25px; font-weight: bold;'>{round(get_latest_pe_ratio(selected_ticker),2)}</p>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: #bcede7; font-size: 48px; margin-top: -25px; font-weight: bold;'>{format_metric(indicators['pe'], 2)}</p>", unsafe_allow_html=True)
 
         # Cinquième colonne (ROA)
         with col5:
             st.markdown(f"<h3 style='color: #d5f2b6; margin-bottom: -10px;'>ROA</h3>", unsafe_allow_html=True)
             st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)  # Ligne séparatrice avec marges ajustées
-            st.markdown(f"<p style='color: #e0ecbc; font-size: 48px; margin-top: -25px; font-weight: bold;'>{round(get_latest_roa(selected_ticker),1)}</p>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: #e0ecbc; font-size: 48px; margin-top: -25px; font-weight: bold;'>{format_metric(indicators['roa'], 1)}</p>", unsafe_allow_html=True)
 
         # Sixième colonne (ROE)
         with col6:
             st.markdown(f"<h3 style='color: #8ef5c8; margin-bottom: -10px;'>ROE</h3>", unsafe_allow_html=True)  # Réduire l'écart entre le titre et la barre
             st.markdown(f"<hr style='border:1px solid {separator_color}; margin-top: -5px; margin-bottom: 5px;'/>", unsafe_allow_html=True)  # Ligne séparatrice avec marges ajustées
-            st.markdown(f"<p style='color: #9ce4c6; font-size: 48px; margin-top: -25px; font-weight: bold;'>{round(get_roe(selected_ticker),2)}</p>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: #9ce4c6; font-size: 48px; margin-top: -25px; font-weight: bold;'>{format_metric(indicators['roe'], 2)}</p>", unsafe_allow_html=True)
 
 
-        top_holders_df = get_top_holders(selected_ticker)
+        top_holders_df = tables["holders"]
         if top_holders_df is not None:
             st.write(f"Principaux détenteurs institutionnels de {selected_ticker.upper()}:")
             st.table(top_holders_df)
@@ -0,0 +1,256 @@
+import os
+import re
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, FeatureNotFound
+
+from telemetry import span, propagate
+from rate_limit import CircuitOpenError, limited
+
+
+logger = logging.getLogger(__name__)
+
+# Paramètres de téléchargement des articles
+FETCH_MAX_WORKERS = int(os.getenv("ARTICLE_MAX_WORKERS", "8"))
+FETCH_PER_HOST = int(os.getenv("ARTICLE_PER_HOST", "2"))
+FETCH_CONNECT_TIMEOUT = float(os.getenv("ARTICLE_CONNECT_TIMEOUT", "3"))
+FETCH_READ_TIMEOUT = float(os.getenv("ARTICLE_READ_TIMEOUT", "5"))
+FETCH_DEADLINE = float(os.getenv("ARTICLE_DEADLINE", "10"))  # durée max d'un téléchargement complet
+FETCH_MAX_BYTES = int(os.getenv("ARTICLE_MAX_BYTES", str(2 * 1024 * 1024)))
+ARTICLE_MAX_TOKENS = int(os.getenv("ARTICLE_MAX_TOKENS", "1500"))  # texte conservé par article
+MIN_PARAGRAPH_CHARS = 40
+BOILERPLATE_MAX_CHARS = 200  # au-delà, un paragraphe qui cite une phrase type est gardé
+
+# Pages de blocage / d'attente renvoyées à la place de l'article
+BLOCKED_MARKERS = (
+    "Thank you for your patience. Our engineers are working quickly to resolve the issue.",
+    "Please enable JavaScript",
+    "Are you a robot",
+)
+
+# Éléments et paragraphes qui ne font pas partie de l'article
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "figure", "iframe"]
+# Classes / id comparés en entier : "share-enabled" ou "cookie-free-story" ne sont pas des encarts
+BOILERPLATE_ATTRS = frozenset("""
+cookie cookies cookie-banner cookie-consent consent newsletter newsletter-signup subscribe subscription
+related related-articles related-stories promo advert advertisement ad ads share share-buttons social
+social-share recommended recommendations paywall
+""".split())
+BOILERPLATE_PHRASES = (
+    "we use cookies", "accept cookies", "cookie policy", "cookie settings", "subscribe to our newsletter",
+    "sign up for our newsletter", "all rights reserved", "advertisement", "privacy policy",
+    "terms of service", "read more", "click here", "follow us",
+)
+BOILERPLATE_PATTERN = re.compile(r"\b(?:" + "|".join(re.escape(phrase) for phrase in BOILERPLATE_PHRASES) + r")\b")
+MAIN_SELECTORS = ["[itemprop=articleBody]", ".caas-body", ".article-body", "article", "main", "[role=main]"]  # caas-body : Yahoo Finance
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; financial-adviser/1.0)"}
+
+_session = None
+_session_lock = threading.Lock()
+_host_limits = {}
+_host_lock = threading.Lock()
+
+
+def get_session():
+    """Session HTTP partagée : les connexions sont réutilisées entre les articles."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=max(FETCH_MAX_WORKERS, FETCH_PER_HOST))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+
+def host_limit(url):
+    host = urlparse(url).netloc.lower()
+    with _host_lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(FETCH_PER_HOST)
+        return _host_limits[host]
+
+
+def fetch_html(url):
+    """
+    Télécharge une page avec timeout, durée maximale et taille maximale.
+    Retourne le contenu (bytes) ou None si la page n'a pas pu être récupérée.
+    Le débit par site est limité et les réponses 429/5xx sont retentées (voir rate_limit).
+    """
+    if not url:
+        return None
+    host = urlparse(url).netloc
+    try:
+        with host_limit(url), span("article", "fetch", host=host) as fetch_span:
+            start = time.monotonic()
+
+            def download():
+                with get_session().get(url, timeout=(FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT), stream=True) as response:
+                    response.raise_for_status()
+                    content_type = response.headers.get("Content-Type", "")
+                    if content_type and "html" not in content_type:
+                        logger.info("Article ignoré (%s) : %s", content_type, url)
+                        return None
+
+                    chunks = []
+                    size = 0
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        chunks.append(chunk)
+                        size += len(chunk)
+                        if size >= FETCH_MAX_BYTES:
+                            logger.info("Article tronqué à %d octets : %s", size, url)
+                            break
+                        if time.monotonic() - start > FETCH_DEADLINE:
+                            logger.info("Article abandonné (trop lent) : %s", url)
+                            fetch_span.set(bytes=size, outcome="deadline")
+                            return None
+                    fetch_span.set(bytes=size, status=response.status_code)
+                    return b"".join(chunks)[:FETCH_MAX_BYTES]
+
+            return limited("news", download, key=host.lower())
+    except (requests.RequestException, CircuitOpenError) as e:
+        logger.info("Échec du téléchargement de %s : %s", url, e)
+        return None
+
+
+def estimate_tokens(text):
+    # Approximation : ~4 caractères par token
+    return len(text) // 4 + 1
+
+
+def make_soup(content):
+    try:
+        return BeautifulSoup(content, 'lxml')
+    except FeatureNotFound:
+        return BeautifulSoup(content, 'html.parser')
+
+
+def is_boilerplate_element(tag):
+    if tag.attrs is None:
+        return False
+    names = list(tag.get("class") or []) + (tag.get("id") or "").split()
+    return any(name.lower() in BOILERPLATE_ATTRS for name in names)
+
+
+def is_boilerplate_paragraph(text):
+    # Seuls les paragraphes courts sont des mentions types ; un vrai paragraphe peut citer ces mots
+    return len(text) <= BOILERPLATE_MAX_CHARS and BOILERPLATE_PATTERN.search(text) is not None
+
+
+def main_container(soup):
+    """Élément qui contient l'article (article, main), ou None si la page n'en a pas."""
+    for selector in MAIN_SELECTORS:
+        container = soup.select_one(selector)
+        if container is not None and container.find('p') is not None:
+            return container
+    return None
+
+
+def extract_text(content, max_tokens=ARTICLE_MAX_TOKENS):
+    """
+    Extrait le texte principal d'une page : paragraphes hors navigation,
+    bannières et encarts, sans doublons, tronqué à max_tokens (estimés).
+
+    Returns:
+        tuple: (texte, statistiques {raw_bytes, raw_chars, kept_chars, raw_tokens, kept_tokens})
+    """
+    soup = make_soup(content)
+    all_paragraphs = soup.find_all('p')
+    raw_chars = sum(len(para.get_text()) for para in all_paragraphs)
+
+    # Le conteneur de l'article et ses parents ne sont jamais retirés, quelles que soient leurs classes
+    container = main_container(soup)
+    protected = set() if container is None else {id(container)} | {id(parent) for parent in container.parents}
+    for tag in soup.find_all(BOILERPLATE_TAGS) + soup.find_all(is_boilerplate_element):
+        if id(tag) not in protected:
+            tag.decompose()
+
+    kept = []
+    seen = set()
+    budget = max_tokens * 4
+    size = 0
+    for para in (container or soup).find_all('p'):
+        text = " ".join(para.get_text().split())
+        if len(text) < MIN_PARAGRAPH_CHARS:
+            continue
+        lowered = text.lower()
+        if lowered in seen or is_boilerplate_paragraph(lowered):
+            continue
+        seen.add(lowered)
+        if size + len(text) > budget:
+            # Dernier paragraphe coupé pour rester dans le budget
+            remaining = budget - size
+            if remaining > MIN_PARAGRAPH_CHARS:
+                kept.append(text[:remaining])
+            break
+        kept.append(text)
+        size += len(text) + 1
+
+    article_text = " ".join(kept)
+    stats = {
+        "raw_bytes": len(content),
+        "raw_chars": raw_chars,
+        "kept_chars": len(article_text),
+        "raw_tokens": raw_chars // 4,
+        "kept_tokens": estimate_tokens(article_text) if article_text else 0,
+    }
+    return article_text, stats
+
+
+def is_blocked(text):
+    # Les pages de blocage sont courtes ; un long article qui cite ces phrases est conservé
+    return not text.strip() or (len(text) < 2000 and any(marker in text for marker in BLOCKED_MARKERS))
+
+
+def fetch_article_with_stats(url, max_tokens=ARTICLE_MAX_TOKENS):
+    content = fetch_html(url)
+    if content is None:
+        return None, None
+    text, stats = extract_text(content, max_tokens)
+    if is_blocked(text):
+        logger.info("Article bloqué ou vide : %s", url)
+        return None, stats
+    logger.info(
+        "Article %s : %d octets, %d -> %d caractères (~%d tokens)",
+        url, stats["raw_bytes"], stats["raw_chars"], stats["kept_chars"], stats["kept_tokens"],
+    )
+    return text, stats
+
+
+def fetch_article(url, max_tokens=ARTICLE_MAX_TOKENS):
+    return fetch_article_with_stats(url, max_tokens)[0]
+
+
+def fetch_articles(urls, max_workers=None, max_tokens=ARTICLE_MAX_TOKENS):
+    """
+    Télécharge et extrait plusieurs articles en parallèle.
+
+    Returns:
+        dict: url -> texte, uniquement pour les articles récupérés (ordre des urls conservé).
+    """
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if not urls:
+        return {}
+    max_workers = min(max_workers or FETCH_MAX_WORKERS, len(urls))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="article") as executor:
+        fetched = list(executor.map(propagate(lambda url: fetch_article_with_stats(url, max_tokens)), urls))
+
+    articles = {url: text for url, (text, _) in zip(urls, fetched) if text is not None}
+    stats = [stats for _, stats in fetched if stats is not None]
+    logger.info(
+        "Articles : %d/%d conservés, %d octets téléchargés, %d -> %d caractères",
+        len(articles), len(urls),
+        sum(stat["raw_bytes"] for stat in stats),
+        sum(stat["raw_chars"] for stat in stats),
+        sum(len(text) for text in articles.values()),
+    )
+    return articles
@@ -0,0 +1,66 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+access_key = os.getenv("AWS_ACCESS_KEY_ID")
+secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
+session_token = os.getenv("AWS_SESSION_TOKEN")
+region_name = os.getenv("AWS_DEFAULT_REGION")
+
+# Réglages botocore communs à tous les clients
+MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
+CONNECT_TIMEOUT = float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("BEDROCK_READ_TIMEOUT", "300"))  # les agents peuvent répondre lentement
+# Tentatives de botocore pour un même appel ; les limitations sont surtout retentées par
+# rate_limit, dont le débit et le disjoncteur sont partagés par tous les appelants
+MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "2"))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def client_config():
+    return Config(
+        region_name=region_name,
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={"total_max_attempts": MAX_ATTEMPTS, "mode": "standard"},
+        tcp_keepalive=True,
+    )
+
+
+def get_client(service_name):
+    """
+    Retourne le client boto3 partagé pour ce service (créé au premier appel).
+    Les clients boto3 sont utilisables depuis plusieurs threads ; seule leur
+    création doit être protégée, d'où le verrou et la session dédiée.
+    """
+    with _lock:
+        if service_name not in _clients:
+            session = boto3.session.Session(
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                aws_session_token=session_token,
+                region_name=region_name,
+            )
+            _clients[service_name] = session.client(service_name, config=client_config())
+        return _clients[service_name]
+
+
+def register_client(service_name, client):
+    """Remplace le client d'un service (par exemple par un faux client pour les benchmarks)."""
+    with _lock:
+        _clients[service_name] = client
+
+
+def reset_clients():
+    """Oublie les clients créés (par exemple après un changement de credentials)."""
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from datetime import date, datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import price_store
+from bedrock_agents import BEDROCK_MAX_CONCURRENCY, set_bedrock_concurrency
+from chart_utils import fetch_sp500_tickers
+from file_utils import atomic_write
+from macro_digest import get_macro_digest
+from reportpdf import create_pdf, shared_charts, preload_charts
+from report_jobs import DONE, FAILED
+from telemetry import trace
+
+
+logger = logging.getLogger(__name__)
+
+# Génération des rapports PDF de plusieurs tickers en une commande :
+#   python batch_reports.py AAPL MSFT      ou      python batch_reports.py --all
+# Le contexte commun (prix, digest macro, graphiques ^IRX/^VIX) est préparé une seule fois,
+# puis les rapports sont générés en parallèle sous la limite globale d'appels Bedrock.
+REPORT_BATCH_DIR = os.getenv("REPORT_BATCH_DIR", "reports")
+REPORT_BATCH_WORKERS = int(os.getenv("REPORT_BATCH_WORKERS", "4"))
+SUMMARY_FILE = "summary.json"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Génération des rapports PDF pour une liste de tickers")
+    parser.add_argument("tickers", nargs="*", help="tickers à traiter")
+    parser.add_argument("--all", action="store_true", help="tous les tickers du S&P 500")
+    parser.add_argument("--output-dir", default=None, help=f"dossier de sortie (défaut : {REPORT_BATCH_DIR}/<jour>)")
+    parser.add_argument("--workers", type=int, default=REPORT_BATCH_WORKERS, help="rapports générés en même temps")
+    parser.add_argument("--bedrock-concurrency", type=int, default=BEDROCK_MAX_CONCURRENCY,
+                        help="appels Bedrock simultanés, tous rapports confondus")
+    parser.add_argument("--processes", action="store_true", help="un processus par rapport au lieu d'un thread")
+    parser.add_argument("--force", action="store_true", help="régénérer les rapports déjà terminés")
+    args = parser.parse_args(argv)
+    if not args.tickers and not args.all:
+        parser.error("indiquer des tickers ou --all")
+    return args
+
+
+def report_filename(ticker):
+    return f"rapport_{ticker}.pdf"
+
+
+def load_summary(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Résumé illisible (%s), reprise impossible : %s", path, e)
+        return None
+
+
+def save_summary(summary, path):
+    summary["updated"] = datetime.now(timezone.utc).isoformat()
+    atomic_write(path, lambda f: json.dump(summary, f, indent=2, ensure_ascii=False))
+
+
+def pending_tickers(tickers, summary, output_dir, force=False):
+    """Tickers restant à générer : ceux déjà terminés (PDF présent) sont sautés à la reprise."""
+    if force:
+        return list(tickers)
+    done = {
+        ticker for ticker, report in summary["reports"].items()
+        if report["status"] == DONE and os.path.exists(os.path.join(output_dir, report["file"]))
+    }
+    return [ticker for ticker in tickers if ticker not in done]
+
+
+def prepare_shared_context(tickers):
+    """Prépare une fois pour tout le lot ce qui ne dépend pas du ticker."""
+    start = time.perf_counter()
+    # Une synchronisation groupée des prix au lieu d'une par rapport
+    price_store.ensure_fresh(list(tickers) + price_store.MACRO_SYMBOLS)
+    # Enregistré sur disque : les processus de génération le relisent sans le recalculer
+    get_macro_digest()
+    charts = shared_charts()
+    logger.info("Contexte commun prêt en %.1f s", time.perf_counter() - start)
+    return charts
+
+
+def init_worker(charts, bedrock_limit):
+    # Processus de génération : graphiques communs reçus du parent, part de la limite Bedrock
+    logging.basicConfig(level=logging.INFO)
+    preload_charts(charts)
+    set_bedrock_concurrency(bedrock_limit)
+
+
+def build_report(ticker, output_dir):
+    """Génère le rapport d'un ticker ; retourne son entrée du résumé (jamais d'exception)."""
+    filename = report_filename(ticker)
+    path = os.path.join(output_dir, filename)
+    start = time.perf_counter()
+    try:
+        with trace("rapport", ticker=ticker):
+            # Le PDF n'apparaît sous son nom qu'une fois complet
+            timings = atomic_write(path, lambda f: create_pdf(f, ticker), "wb")
+        status, error = DONE, None
+    except Exception as e:
+        logger.exception("Échec du rapport %s", ticker)
+        timings, status, error = {}, FAILED, f"{type(e).__name__}: {e}"
+    return {
+        "ticker": ticker,
+        "status": status,
+        "file": filename if status == DONE else None,
+        "duration": round(time.perf_counter() - start, 3),
+        "stages": {name: round(timing["duration"], 3) for name, timing in timings.items()},
+        "error": error,
+        "finished": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def make_executor(args, charts):
+    workers = max(1, args.workers)
+    if args.processes:
+        # Chaque processus a son propre compteur : la limite globale est répartie entre eux
+        bedrock_limit = max(1, args.bedrock_concurrency // workers)
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(charts, bedrock_limit),
+        )
+    set_bedrock_concurrency(args.bedrock_concurrency)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+
+
+def run_batch(tickers, output_dir, args):
+    os.makedirs(output_dir, exist_ok=True)
+    summary_path = os.path.join(output_dir, SUMMARY_FILE)
+    summary = load_summary(summary_path) or {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "reports": {},
+    }
+    todo = pending_tickers(tickers, summary, output_dir, args.force)
+    skipped = len(tickers) - len(todo)
+    if skipped:
+        print(f"Reprise : {skipped} rapport(s) déjà terminé(s) dans {output_dir}")
+    if not todo:
+        return summary
+
+    charts = prepare_shared_context(todo)
+    batch_start = time.perf_counter()
+    executor = make_executor(args, charts)
+    try:
+        futures = [executor.submit(build_report, ticker, output_dir) for ticker in todo]
+        for count, future in enumerate(as_completed(futures), 1):
+            report = future.result()
+            summary["reports"][report["ticker"]] = report
+            # Résumé mis à jour après chaque rapport : une interruption perd au plus les rapports en cours
+            save_summary(summary, summary_path)
+            detail = report["error"] or f"{report['duration']:.1f} s"
+            print(f"[{count}/{len(todo)}] {report['ticker']} : {report['status']} ({detail})")
+    except KeyboardInterrupt:
+        print("Interruption : relancer la même commande pour reprendre")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    summary["last_run"] = {
+        "tickers": len(todo),
+        "workers": args.workers,
+        "processes": args.processes,
+        "bedrock_concurrency": args.bedrock_concurrency,
+        "duration": round(time.perf_counter() - batch_start, 3),
+    }
+    save_summary(summary, summary_path)
+    return summary
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args(argv)
+    tickers = fetch_sp500_tickers() if args.all else [ticker.upper() for ticker in args.tickers]
+    # Dossier du jour par défaut : relancer la commande le même jour reprend le lot
+    output_dir = args.output_dir or os.path.join(REPORT_BATCH_DIR, date.today().isoformat())
+
+    summary = run_batch(tickers, output_dir, args)
+    reports = [summary["reports"][ticker] for ticker in tickers if ticker in summary["reports"]]
+    failed = [report for report in reports if report["status"] == FAILED]
+    done = len(reports) - len(failed)
+    print(f"{done} rapport(s) terminé(s), {len(failed)} échec(s) ; résumé : {os.path.join(output_dir, SUMMARY_FILE)}")
+    for report in failed:
+        print(f"  {report['ticker']} : {report['error']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,65 +1,104 @@
 
 import logging
-import boto3
 from botocore.exceptions import ClientError
 import json
 import os
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 
 import yfinance as yf
 import pandas as pd
 
-import requests
-from bs4 import BeautifulSoup
+from aws_clients import get_client
+from articles import fetch_article, fetch_articles, estimate_tokens
+from response_cache import cached_response, cache_enabled, lookup, store
+from telemetry import span, start_span, propagate
+from rate_limit import get_limiter, limited
 
 
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 import uuid
-session_id = str(uuid.uuid4())
 
 ticker_name = "RTX" # mettre la variable choisi dans la liste
 
-access_key = os.getenv("AWS_ACCESS_KEY_ID")
-secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-session_token = os.getenv("AWS_SESSION_TOKEN")
-region_name = os.getenv("AWS_DEFAULT_REGION")
-
-bedrock_client = boto3.client('bedrock-runtime', region_name=region_name,
-    aws_access_key_id=access_key,
-    aws_secret_access_key=secret_key,
-    aws_session_token=session_token  )
-
 agent_id = os.getenv("AGENT_ID")
 agent_alias = os.getenv("AGENT_ALIAS")
 
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+
+# Texte d'une section dont l'agent n'a pas pu répondre (limitation persistante, panne)
+UNAVAILABLE_SECTION = "<i>Analyse indisponible pour le moment (service Bedrock ou yfinance surchargé ou en panne).</i>"
+
+# Nombre maximal d'appels Bedrock (invoke_model et invoke_agent) en vol dans le processus,
+# tous rapports, agents et chats confondus
+BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "32"))
+_bedrock_slots = threading.BoundedSemaphore(BEDROCK_MAX_CONCURRENCY)
+
+
+def set_bedrock_concurrency(limit):
+    """Change la limite d'appels Bedrock simultanés (par exemple dans un processus de génération par lot)."""
+    global _bedrock_slots
+    _bedrock_slots = threading.BoundedSemaphore(max(1, limit))
+
+
+@contextmanager
+def bedrock_slot(call_span):
+    # Attente d'une place libre, enregistrée dans le span de l'appel
+    slots = _bedrock_slots
+    start = time.perf_counter()
+    with slots:
+        call_span.set(queued=round(time.perf_counter() - start, 4))
+        yield
+
+
 
 
 
 
+def invoke_claude(operation, body):
+    """
+    Appelle invoke_model (API Messages de Claude 3) et retourne le corps de la
+    réponse décodé. L'appel est chronométré avec les tokens et octets échangés ;
+    les limitations et pannes passagères sont retentées (voir rate_limit).
+    """
+    def attempt():
+        # La place n'est pas gardée pendant l'attente entre deux tentatives
+        with bedrock_slot(call_span):
+            response = get_client("bedrock-runtime").invoke_model(
+                modelId=MODEL_ID,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(body),
+            )
+            return response['body'].read()
+
+    with span("bedrock", "invoke_model", operation=operation, model=MODEL_ID) as call_span:
+        raw = limited("invoke_model", attempt)
+        response_body = json.loads(raw.decode('utf-8'))
+        usage = response_body.get("usage") or {}
+        call_span.set(input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"), bytes=len(raw))
+        return response_body
+
 
 # Fonction pour l'analyse de sentiment en utilisant l'API Messages de Claude 3
 def analyze_sentiment(text):
     try:
         # Préparation de la requête pour l'API Messages
-        response = bedrock_client.invoke_model(
-            modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 50,
-                "temperature": 0.5,
-                "messages": [
-                    {"role": "user", "content": f"Analyse le sentiment de ce texte : \"{text}\""}
-                ]
-            })
-        )
+        response_body = invoke_claude("sentiment", {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": 50,
+            "temperature": 0.5,
+            "messages": [
+                {"role": "user", "content": f"Analyse le sentiment de ce texte : \"{text}\""}
+            ]
+        })
 
-        # Affichage de la réponse brute pour diagnostic
-        response_body = json.loads(response['body'].read().decode('utf-8'))
-        
         # Vérification de la structure de la réponse et extraction du texte
         content = response_body.get("content")
         if isinstance(content, list):
@@ -69,107 +108,302 @@ def analyze_sentiment(text):
         
         return sentiment_analysis or "Pas de résultat détecté"
     except Exception as e:
-        print("Erreur :", e)
-        return None
-
-
-
-
-def call_agent_with_prompt(user_prompt,agent_alias):
-    runtime_client=boto3.client(
-        service_name="bedrock-agent-runtime",
-        region_name=region_name,
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        aws_session_token=session_token  # Facultatif
-    ),
+        logger.error("Erreur d'analyse de sentiment : %s", e)
+        return ""
+
+
+
+
+def stream_agent_with_prompt(user_prompt,agent_alias,session=None,use_cache=True):
+    """
+    Appelle un agent Bedrock et retourne les morceaux de la réponse au fur et
+    à mesure de leur arrivée (générateur). Une réponse en cache est renvoyée
+    en un seul morceau. Les erreurs de l'appel sont propagées.
+    """
+    agent_key = f"{agent_id}/{agent_alias}"
+    # Sans session fournie, l'appel n'a pas de mémoire partagée avec d'autres
+    session = session or str(uuid.uuid4())
+    if cache_enabled(use_cache):
+        cached = lookup("agent", agent_key, user_prompt)
+        if cached is not None:
+            yield cached
+            return
+
+    # Span géré à la main : il couvre toute la consommation du générateur
+    call_span = start_span("bedrock", "invoke_agent", agent_alias=agent_alias, input_tokens=estimate_tokens(user_prompt))
+    limiter = get_limiter("invoke_agent")
+    parts = []
+    size = 0
+    attempt = 0
+    pending = False  # tentative dont le résultat n'est pas encore transmis au limiteur
     try:
-        
-        response = runtime_client[0].invoke_agent(
-            agentId=agent_id,
-            agentAliasId=agent_alias,  #agent alias
-            sessionId=session_id,
-            inputText=user_prompt,
-            #enableTrace=True
-        )
-        event_stream = response.get('completion')
-        response_text = ''
-
-        for event in event_stream:
-           
-            if 'chunk' in event:
-                chunk = event['chunk']
-                
-                content = chunk.get('bytes', b'').decode('utf-8')
-                response_text += content
-            else:
-                print("Événement non traité :", event)
-
-        return response_text
+        while True:
+            attempt += 1
+            limiter.acquire()
+            pending = True
+            try:
+                # La place est gardée jusqu'à la fin du flux de réponse
+                with bedrock_slot(call_span):
+                    # Client partagé : connexions déjà ouvertes réutilisées entre les appels
+                    runtime_client = get_client("bedrock-agent-runtime")
+                    response = runtime_client.invoke_agent(
+                        agentId=agent_id,
+                        agentAliasId=agent_alias,  #agent alias
+                        sessionId=session,
+                        inputText=user_prompt,
+                        streamingConfigurations={"streamFinalResponse": True},
+                        #enableTrace=True
+                    )
+                    event_stream = response.get('completion')
+
+                    for event in event_stream:
+
+                        if 'chunk' in event:
+                            chunk = event['chunk']
+                            call_span.first_chunk()
+
+                            raw = chunk.get('bytes', b'')
+                            size += len(raw)
+                            content = raw.decode('utf-8')
+                            parts.append(content)
+                            yield content
+                        else:
+                            logger.warning("Événement non traité : %s", event)
+            except Exception as e:
+                pending = False
+                if parts:
+                    # Flux coupé après les premiers morceaux : pas de nouvelle tentative, mais l'échec compte
+                    limiter.breaker.failed()
+                    raise
+                # Nouvelle tentative seulement si rien n'a encore été renvoyé à l'appelant
+                if not limiter.failed(e, attempt):
+                    raise
+                continue
+            pending = False
+            limiter.succeeded()
+            break
+    except GeneratorExit as e:
+        # L'appelant a fermé le flux après des morceaux reçus : l'agent répondait
+        if pending:
+            pending = False
+            limiter.succeeded()
+        call_span.finish(e)
+        raise
+    except BaseException as e:
+        call_span.finish(e)
+        raise
+    finally:
+        if pending:
+            # Interruption (KeyboardInterrupt...) : ne pas laisser le disjoncteur en attente d'un appel test
+            limiter.breaker.release()
+    call_span.set(attempts=attempt)
+
+    response_text = ''.join(parts)
+    call_span.set(output_tokens=estimate_tokens(response_text), bytes=size, chunks=len(parts))
+    call_span.finish()
+    if cache_enabled(use_cache) and response_text:
+        store("agent", agent_key, user_prompt, response_text)
+
+
+def call_agent_with_prompt(user_prompt,agent_alias,session=None,use_cache=True):
+    """
+    Appelle un agent Bedrock et retourne la réponse complète (UNAVAILABLE_SECTION
+    si l'agent n'a pas pu répondre malgré les nouvelles tentatives).
+    Les réponses sont mises en cache sur disque (voir response_cache) sauf si
+    use_cache=False, par exemple pour le chat dont la réponse dépend de la
+    mémoire de la session.
+    """
+    try:
+        return ''.join(stream_agent_with_prompt(user_prompt, agent_alias, session, use_cache))
 
     except Exception as e:
-        print("Erreur lors de l'appel à l'agent :", e)
-        return None
+        logger.error("Erreur lors de l'appel à l'agent %s : %s", agent_alias, e)
+        return UNAVAILABLE_SECTION
     
 
 # Fonction pour extraire le texte principal de l'article
 def extract_article_text(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    # Extraction des paragraphes de l'article
-    paragraphs = soup.find_all('p')
-    article_text = ' '.join([para.get_text() for para in paragraphs])
-    return article_text
+    return fetch_article(url) or ""
 
 
-def analyze_subject_sentiment(text):
-    try:
-        response = bedrock_client.invoke_model(
-            modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps({
+def analyze_subject_sentiment(text,use_cache=True):
+    prompt = f"Donne uniquement sujet principal de cet article ainsi que le sentiment du text associé sans explicatioN: \"{text}\""
+
+    def invoke():
+        try:
+            response_body = invoke_claude("subject_sentiment", {
                 "anthropic_version": "bedrock-2023-05-31",
                 "max_tokens": 100,
                 "temperature": 0.5,
                 "messages": [
-                    {"role": "user", "content": f"Donne uniquement sujet principal de cet article ainsi que le sentiment du text associé sans explicatioN: \"{text}\""}
+                    {"role": "user", "content": prompt}
                 ]
             })
-        )
-        
-        response_body = json.loads(response['body'].read().decode('utf-8'))
-        content = response_body.get("content")
+
+            content = response_body.get("content")
+            
+            subject_analysis = content[0]["text"] if content else "Pas de sujet détecté"
+            return subject_analysis
         
-        subject_analysis = content[0]["text"] if content else "Pas de sujet détecté"
-        return subject_analysis
-    
-    except Exception as e:
-        print("Erreur d'analyse du sujet :", e)
-        return None
+        except Exception as e:
+            logger.error("Erreur d'analyse du sujet : %s", e)
+            return None
+
+    # None (erreur) n'est pas mis en cache
+    return cached_response("subject_sentiment", MODEL_ID, prompt, invoke, use_cache) or ""
     
 
 
+# Budget (en tokens estimés) d'une requête regroupant plusieurs articles
+BATCH_TOKEN_BUDGET = int(os.getenv("NEWS_BATCH_TOKEN_BUDGET", "12000"))
+BATCH_ARTICLE_MAX_TOKENS = int(os.getenv("NEWS_ARTICLE_MAX_TOKENS", "1500"))
+
+
+def make_batches(texts, token_budget=BATCH_TOKEN_BUDGET, max_tokens_per_text=BATCH_ARTICLE_MAX_TOKENS):
+    """
+    Tronque chaque texte puis les regroupe en lots dont la taille estimée
+    reste sous token_budget. Retourne une liste de listes de (index, texte).
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for index, text in enumerate(texts):
+        text = text[:max_tokens_per_text * 4]
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > token_budget:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append((index, text))
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    logger.info(
+        "Lots : %d textes, ~%d -> ~%d tokens, %d requête(s)",
+        len(texts), sum(estimate_tokens(text) for text in texts),
+        sum(estimate_tokens(text) for batch in batches for _, text in batch), len(batches),
+    )
+    return batches
+
+
+def parse_batch_response(response_text):
+    """Extrait la liste JSON de la réponse du modèle ; retourne {id: enregistrement}."""
+    if not response_text:
+        return {}
+    start = response_text.find("[")
+    end = response_text.rfind("]")
+    if start == -1 or end == -1:
+        return {}
+    try:
+        records = json.loads(response_text[start:end + 1])
+    except json.JSONDecodeError:
+        logger.warning("Réponse JSON invalide : %s", response_text[:200])
+        return {}
+    parsed = {}
+    for record in records:
+        if not isinstance(record, dict) or "id" not in record:
+            continue
+        try:
+            record_id = int(record["id"])
+        except (TypeError, ValueError):
+            logger.warning("Identifiant d'article invalide : %r", record["id"])
+            continue
+        try:
+            score = float(record.get("score", 0))
+        except (TypeError, ValueError):
+            score = 0.0
+        parsed[record_id] = {
+            "subject": str(record.get("subject", "")),
+            "sentiment": str(record.get("sentiment", "neutre")),
+            "score": score,
+        }
+    return parsed
+
+
+def analyze_subject_sentiment_batch(texts, token_budget=BATCH_TOKEN_BUDGET, use_cache=True):
+    """
+    Classe plusieurs articles en une requête par lot (sujet, sentiment, score).
+
+    Returns:
+        list: un dictionnaire {"subject", "sentiment", "score"} par texte, ou None
+        si le modèle n'a rien renvoyé pour cet article.
+    """
+    results = [None] * len(texts)
+    for batch in make_batches(texts, token_budget):
+        articles_block = "\n".join(f'<article id="{index}">\n{text}\n</article>' for index, text in batch)
+        prompt = (
+            "Pour chaque article ci-dessous, donne uniquement le sujet principal et le sentiment associé. "
+            "Réponds uniquement avec une liste JSON, sans explication, au format "
+            '[{"id": <id>, "subject": "<sujet>", "sentiment": "positif|neutre|négatif", "score": <nombre entre -1 et 1>}].\n'
+            + articles_block
+        )
+
+        def invoke():
+            try:
+                response_body = invoke_claude("subject_sentiment_batch", {
+                    "anthropic_version": "bedrock-2023-05-31",
+                    "max_tokens": 80 * len(batch) + 50,
+                    "temperature": 0,
+                    "messages": [
+                        {"role": "user", "content": prompt}
+                    ]
+                })
+
+                content = response_body.get("content")
+                text = content[0]["text"] if content else None
+
+            except Exception as e:
+                logger.error("Erreur d'analyse du lot d'articles : %s", e)
+                return None
+            # Une réponse illisible (JSON tronqué ou invalide) n'est pas mise en cache
+            if not any(index in parse_batch_response(text) for index, _ in batch):
+                logger.warning("Aucun article du lot dans la réponse du modèle")
+                return None
+            return text
+
+        response_text = cached_response("subject_sentiment", f"{MODEL_ID}/batch", prompt, invoke, use_cache)
+        records = parse_batch_response(response_text)
+        # Les identifiants sont les positions dans la liste d'origine
+        for index, _ in batch:
+            results[index] = records.get(index)
+    return results
+
+
+def caption_summary_batch(texts, max_token_per_text=150, token_budget=BATCH_TOKEN_BUDGET, use_cache=True):
+    """Résume plusieurs articles par requête plutôt qu'un appel par article."""
+    summaries = []
+    for batch in make_batches(texts, token_budget):
+        joined = "\n\n".join(f"Article {number + 1} : {text}" for number, (_, text) in enumerate(batch))
+        summary = caption_summary(joined, max_token_per_text * len(batch), use_cache=use_cache)
+        if summary:
+            summaries.append(summary)
+    return summaries
+
+
 # Fonction principale pour obtenir les informations d'actualité avec sujet et sentiment
 def get_news_with_sentiment(ticker_name):
-    
+    """Sujet et sentiment des dernières actualités, ou UNAVAILABLE_SECTION si yfinance ne répond pas."""
     ticker = yf.Ticker(ticker_name)
-    news = ticker.news
+    try:
+        with span("yfinance", "news", symbol=ticker_name):
+            news = limited("yfinance", lambda: ticker.news)
+    except Exception as e:
+        logger.error("Actualités indisponibles pour %s : %s", ticker_name, e)
+        return UNAVAILABLE_SECTION
     sentiment_output = ''
     
-    for item in news:
+    articles = fetch_articles(item.get('link') for item in news)
+    kept = [item for item in news if item.get('link') in articles]
+
+    # Sujet et sentiment de tous les articles en quelques requêtes
+    records = analyze_subject_sentiment_batch([articles[item.get('link')] for item in kept])
+
+    for item, record in zip(kept, records):
         title = item.get('title')
-        link = item.get('link')
-        source = item.get('publisher')
-        
-        # Extraire le texte de l'article
-        article_text = extract_article_text(link)
+        if record is None:
+            continue
         
-        # Analyser le sujet et le sentiment
-        subject_sentiment = analyze_subject_sentiment(article_text)
-        
-        sentiment_output += title + subject_sentiment
+        sentiment_output += f"{title} : {record['subject']} (sentiment {record['sentiment']}, score {record['score']:+.2f})\n"
         
 
     return sentiment_output
@@ -180,30 +414,30 @@ def get_news_with_sentiment(ticker_name):
 
 
 
-def caption_summary(text,max_token):
-    try:
-        response = bedrock_client.invoke_model(
-            modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps({
+def caption_summary(text,max_token,use_cache=True):
+    prompt = f"Tu es un macro économiste, rédige un résumé des points clés  macro économique des différents sujets, avec détails (ex chiffres) : Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants.\"{text}\""
+
+    def invoke():
+        try:
+            response_body = invoke_claude("caption", {
                 "anthropic_version": "bedrock-2023-05-31",
                 "max_tokens": max_token,
                 "temperature": 0.5,
                 "messages": [
-                    {"role": "user", "content": f"Tu es un macro économiste, rédige un résumé des points clés  macro économique des différents sujets, avec détails (ex chiffres) : Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants.\"{text}\""}
+                    {"role": "user", "content": prompt}
                 ]
             })
-        )
 
-        response_body = json.loads(response['body'].read().decode('utf-8'))
-        content = response_body.get("content")
+            content = response_body.get("content")
+            
+            sentiment_analysis = content[0]["text"] if content else "Pas de sentiment détecté"
+            return sentiment_analysis
         
-        sentiment_analysis = content[0]["text"] if content else "Pas de sentiment détecté"
-        return sentiment_analysis
-    
-    except Exception as e:
-        print("Erreur d'analyse de sentiment :", e)
+        except Exception as e:
+            logger.error("Erreur de résumé : %s", e)
+            return None
+
+    return cached_response("caption", f"{MODEL_ID}/{max_token}", prompt, invoke, use_cache) or ""
 
 
 
@@ -219,19 +453,17 @@ def get_macro_news() :
         "^VIX": "VIX - Volatilité des Marchés"
     }
     
-    output_text = ""
+    links = []
     for ticker_symbol, description in tickers.items():
         ticker = yf.Ticker(ticker_symbol)
-        news_items = ticker.news
-        
-        for item in news_items[:2]:
-            
-            text_article = extract_article_text(item["link"])
-            if text_article != "Thank you for your patience. Our engineers are working quickly to resolve the issue." :
-                
-                text = caption_summary(text_article,150)
-                
-                output_text += text
+        with span("yfinance", "news", symbol=ticker_symbol):
+            news_items = limited("yfinance", lambda: ticker.news)
+        links += [item["link"] for item in news_items[:2]]
+
+    # Téléchargement parallèle ; les pages bloquées sont déjà écartées
+    articles = fetch_articles(links)
+
+    output_text = "".join(caption_summary_batch(list(articles.values()), 150))
     caption_macro = caption_summary(output_text,max_token=300)
     return caption_macro
 
@@ -248,7 +480,7 @@ def gat_analyse_macro(output_macro):
     # Exemple d'appel avec un *prompt* utilisateur
     user_prompt = "Réalise l'analyse macroéconimque en détail ? Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants."
     promt = user_prompt + "Context macro suppélementaire :" + output_macro 
-    response_macro = call_agent_with_prompt(promt,agent_alias)
+    response_macro = call_agent_with_prompt(promt,agent_alias, session=str(uuid.uuid4()))
     
     return output_macro + response_macro
 
@@ -260,7 +492,7 @@ def profil_resp_data(ticker_name):
 
     user_prompt = f"Présente l'entreprise {ticker_name} ? Fais le en Français. Fais une partie aussi sur l'analyse de la concurrence. Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants."
     
-    response_profil = call_agent_with_prompt(user_prompt,agent_alias)
+    response_profil = call_agent_with_prompt(user_prompt,agent_alias, session=str(uuid.uuid4()))
 
     return response_profil
 
@@ -275,7 +507,7 @@ def finance_resp_data(ticker_name):
 
     user_prompt = f"Réalise l'analyse de l'état financère de l'entreprise {ticker_name} ? Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants."
     
-    response_fin = call_agent_with_prompt(user_prompt,agent_alias)
+    response_fin = call_agent_with_prompt(user_prompt,agent_alias, session=str(uuid.uuid4()))
 
     return response_fin
 
@@ -286,11 +518,12 @@ def finance_resp_data(ticker_name):
 
 
 def sentiment_anal(ticker_name, sentiment_output):
-    
+    if sentiment_output == UNAVAILABLE_SECTION:
+        return UNAVAILABLE_SECTION
     agent_alias = os.getenv("AGENT_SENTIMENT_ALIAS")
     user_prompt = f"Réalise l'analyse du sentiment de marché de l'entreprise {ticker_name} avec comme context les dernières actualité et leurs sentiments? Donne aussi quelques données pour affirmer tes propos. Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants."
     promt = user_prompt + "Context actualité et sentiments : " + sentiment_output
-    response_sent = call_agent_with_prompt(promt,agent_alias)
+    response_sent = call_agent_with_prompt(promt,agent_alias, session=str(uuid.uuid4()))
 
     return response_sent
 
@@ -298,7 +531,8 @@ def sentiment_anal(ticker_name, sentiment_output):
 
 def get_officiel(ticker_symbol):
     ticker=yf.Ticker(ticker_symbol)
-    dico_officiers=ticker.info['companyOfficers']
+    with span("yfinance", "info", symbol=ticker_symbol):
+        dico_officiers=limited("yfinance", lambda: ticker.info)['companyOfficers']
     df=pd.DataFrame(dico_officiers)
     for i in ["maxAge","yearBorn","fiscalYear","exercisedValue","unexercisedValue"]:
         df=df.drop(i,axis=1)
@@ -306,16 +540,20 @@ def get_officiel(ticker_symbol):
 
 def get_holders(ticker_symbol):
     ticker=yf.Ticker(ticker_symbol)
-    return pd.DataFrame(ticker.institutional_holders)
+    with span("yfinance", "institutional_holders", symbol=ticker_symbol):
+        return pd.DataFrame(limited("yfinance", lambda: ticker.institutional_holders))
 
 
 def holders_anal(ticker_name):
-    
-    board_output = get_holders(ticker_name).to_string() + get_officiel(ticker_name).to_string() 
+    try:
+        board_output = get_holders(ticker_name).to_string() + get_officiel(ticker_name).to_string()
+    except Exception as e:
+        logger.error("Conseil et actionnaires indisponibles pour %s : %s", ticker_name, e)
+        return UNAVAILABLE_SECTION
     agent_alias = os.getenv("AGENT_BOARD_ALIAS")
     user_prompt = "Réalise une analyse du conseil de l'entreprise en français, sa mixité, ses niveaux de salaire ainsi qu'une rapide analyse des holders. Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants." 
     promt = user_prompt + "Information sur le conseil et holders :" + board_output 
-    response2 = call_agent_with_prompt(promt,agent_alias)
+    response2 = call_agent_with_prompt(promt,agent_alias, session=str(uuid.uuid4()))
 
     return response2
 
@@ -330,20 +568,108 @@ def risk_anal(ticker_name,output_macro):
 
     user_prompt = f"Réalise l'analyse des risques et opportunité de l'entreprise {ticker_name} selon le context macroéconomic et la valeur beta kpi. Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants."
     promt = user_prompt + "Context macroeconomic : " + output_macro
-    response_risk = call_agent_with_prompt(promt,agent_alias)
+    response_risk = call_agent_with_prompt(promt,agent_alias, session=str(uuid.uuid4()))
 
     return response_risk
 
 
 
 
-def tot_anal(ticker_name,response_risk,response_profil,response_macro,response_fin,response_sent):
-    
-    tot_reponse = response_risk + response_profil + response_macro + response_fin + response_sent
+# Budget (tokens estimés) du contexte envoyé à l'agent de synthèse, réparti entre les sections
+SYNTHESIS_TOKEN_BUDGET = int(os.getenv("SYNTHESIS_TOKEN_BUDGET", "3000"))
+SYNTHESIS_SECTIONS = ["risques", "profil", "macro", "finance", "sentiment"]
+SECTION_TOKEN_BUDGET = SYNTHESIS_TOKEN_BUDGET // len(SYNTHESIS_SECTIONS)
+
+
+def truncate_tokens(text, max_tokens):
+    """Coupe le texte (sur un espace) pour que estimate_tokens(texte) <= max_tokens."""
+    max_chars = max(max_tokens - 1, 0) * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def compact_section(name, text, max_tokens=SECTION_TOKEN_BUDGET, use_cache=True):
+    """
+    Réduit une section du rapport à un digest structuré (chiffres clés,
+    signaux, risques) d'au plus max_tokens tokens estimés. Une section déjà
+    assez courte est gardée telle quelle.
+
+    Returns:
+        dict: {"section", "text", "tokens_in", "tokens_out"}
+    """
+    text = text or ""
+    tokens_in = estimate_tokens(text) if text else 0
+    with span("compaction", name, input_tokens=tokens_in) as compaction_span:
+        if tokens_in <= max_tokens:
+            digest = text
+        else:
+            prompt = (
+                f"Réduis la section « {name} » d'un rapport d'analyse financière à un digest structuré, "
+                "sans introduction ni conclusion, au format :\n"
+                "Chiffres clés : ...\nSignaux : ...\nRisques : ...\n"
+                f"Garde les chiffres exacts. {max_tokens * 3 // 4} mots au maximum.\n"
+                f"<section>\n{text}\n</section>"
+            )
+
+            def invoke():
+                try:
+                    response_body = invoke_claude("section_digest", {
+                        "anthropic_version": "bedrock-2023-05-31",
+                        "max_tokens": max_tokens,
+                        "temperature": 0,
+                        "messages": [
+                            {"role": "user", "content": prompt}
+                        ]
+                    })
+                    content = response_body.get("content")
+                    return content[0]["text"] if content else None
+
+                except Exception as e:
+                    logger.error("Erreur de compaction de la section %s : %s", name, e)
+                    return None
+
+            # Sans digest, on garde le début de la section
+            digest = cached_response("section_digest", f"{MODEL_ID}/{max_tokens}", prompt, invoke, use_cache) or text
+        # Budget strict, même si le modèle a répondu trop longuement
+        digest = truncate_tokens(digest, max_tokens)
+        tokens_out = estimate_tokens(digest) if digest else 0
+        compaction_span.set(output_tokens=tokens_out)
+    return {"section": name, "text": digest, "tokens_in": tokens_in, "tokens_out": tokens_out}
+
+
+def tot_anal(ticker_name,response_risk,response_profil,response_macro,response_fin,response_sent,token_budget=SYNTHESIS_TOKEN_BUDGET):
+    """
+    Synthèse finale. Chaque section est compactée (voir compact_section) pour
+    que le contexte de l'agent ne dépasse pas token_budget tokens estimés ;
+    les sections peuvent être passées déjà compactées (étapes compact_* du rapport).
+    """
+    sections = dict(zip(SYNTHESIS_SECTIONS, [response_risk, response_profil, response_macro, response_fin, response_sent]))
+    max_tokens = token_budget // len(sections)
+    pending = [name for name, section in sections.items() if not isinstance(section, dict)]
+    with ThreadPoolExecutor(max_workers=len(pending) or 1, thread_name_prefix="compaction") as executor:
+        compacted = executor.map(propagate(lambda name: compact_section(name, sections[name], max_tokens)), pending)
+        sections.update(zip(pending, compacted))
+
+    tot_reponse = ""
+    tokens_in = tokens_out = 0
+    for name, section in sections.items():
+        text = truncate_tokens(section["text"], max_tokens)
+        tokens_in += section["tokens_in"]
+        tokens_out += estimate_tokens(text) if text else 0
+        tot_reponse += f"\n<section nom=\"{name}\">\n{text}\n</section>"
+    logger.info(
+        "Contexte de synthèse %s : %d -> %d tokens estimés (%s)",
+        ticker_name, tokens_in, tokens_out,
+        ", ".join(f"{name} {s['tokens_in']}->{s['tokens_out']}" for name, s in sections.items()),
+    )
 
     agent_alias = os.getenv("AGENT_RESUME_ALIAS")
     user_prompt = f"Réalise un récapitulatif et un conseil de stratégie vis à vis de l'entreprise {ticker_name}. Donne un avis de BUY, SELL ou HOLD avec tes informations d'un point de vue d'un analyste financier. Insère `<br/>` pour un retour à la ligne simple et utilise plusieurs `<br/><br/>` pour des sauts de ligne plus importants."
     promt = user_prompt + "Context :" + tot_reponse
-    response = call_agent_with_prompt(promt,agent_alias)
+    # Taux de compression visible dans la trace du rapport
+    with span("synthesis", "tot_anal", raw_tokens=tokens_in, context_tokens=tokens_out, ratio=round(tokens_out / max(tokens_in, 1), 3)):
+        response = call_agent_with_prompt(promt,agent_alias, session=str(uuid.uuid4()))
 
-    return response
\ No newline at end of file
+    return response
@@ -0,0 +1,184 @@
+import io
+import re
+import json
+import time
+import threading
+import http.server
+
+import pandas as pd
+
+from benchmarks import fixtures
+
+
+class FakeTicker:
+    """Remplace yf.Ticker : mêmes attributs, données lues dans les fixtures."""
+
+    def __init__(self, symbol, yfinance):
+        self.symbol = symbol
+        self._yf = yfinance
+
+    def _fetch(self, name):
+        self._yf.calls[name] = self._yf.calls.get(name, 0) + 1
+        time.sleep(self._yf.latency)
+
+    @property
+    def info(self):
+        self._fetch("info")
+        return fixtures.info(self.symbol)
+
+    @property
+    def financials(self):
+        self._fetch("financials")
+        return fixtures.statements(self.symbol)[0]
+
+    @property
+    def balance_sheet(self):
+        self._fetch("balance_sheet")
+        return fixtures.statements(self.symbol)[1]
+
+    @property
+    def cashflow(self):
+        self._fetch("cashflow")
+        return fixtures.statements(self.symbol)[2]
+
+    @property
+    def sustainability(self):
+        self._fetch("sustainability")
+        return fixtures.sustainability(self.symbol)
+
+    @property
+    def dividends(self):
+        self._fetch("dividends")
+        return fixtures.dividends(self.symbol)
+
+    @property
+    def institutional_holders(self):
+        self._fetch("institutional_holders")
+        return fixtures.institutional_holders(self.symbol)
+
+    @property
+    def sec_filings(self):
+        self._fetch("sec_filings")
+        return fixtures.sec_filings(self.symbol, self._yf.article_url)
+
+    @property
+    def news(self):
+        self._fetch("news")
+        return fixtures.news(self.symbol, self._yf.article_url)
+
+    def history(self, period="1mo", **kwargs):
+        self._fetch("history")
+        return fixtures.price_history(self.symbol, period=period).drop(columns=["Adj Close"])
+
+
+class FakeYFinance:
+    """Module yfinance factice : Ticker et download, avec latence et compteur d'appels."""
+
+    def __init__(self, latency=0.0, article_url=None):
+        self.latency = latency
+        self.article_url = article_url or (lambda slug: f"http://127.0.0.1:1/{slug}")
+        self.calls = {}
+
+    def Ticker(self, symbol):
+        return FakeTicker(symbol, self)
+
+    def download(self, tickers, start=None, period=None, group_by="column", auto_adjust=True, **kwargs):
+        self.calls["download"] = self.calls.get("download", 0) + 1
+        time.sleep(self.latency)
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        frames = {symbol: fixtures.price_history(symbol, start=start, period=period or "1mo") for symbol in symbols}
+        if group_by == "ticker":
+            return pd.concat(frames, axis=1)
+        data = pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+        return data
+
+
+class FakeBedrockRuntime:
+    """invoke_model factice : latence fixe, réponse JSON au format Claude Messages."""
+
+    def __init__(self, latency=0.5, output_tokens=150):
+        self.latency = latency
+        self.output_tokens = output_tokens
+        self.calls = 0
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self.calls += 1
+        request = json.loads(body)
+        prompt = request["messages"][0]["content"]
+        time.sleep(self.latency)
+        ids = re.findall(r'<article id="(\d+)">', prompt)
+        if ids:
+            text = json.dumps([
+                {"id": int(i), "subject": f"Sujet {i}", "sentiment": "positif", "score": 0.4} for i in ids
+            ])
+        else:
+            text = "Résumé macro : croissance stable, inflation en baisse.<br/>" * (self.output_tokens // 10)
+        payload = {
+            "content": [{"type": "text", "text": text}],
+            "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+        }
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+class FakeAgentRuntime:
+    """invoke_agent factice : délai avant le premier morceau puis morceaux espacés."""
+
+    def __init__(self, latency=1.0, chunks=20, chunk_delay=0.05):
+        self.latency = latency
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+
+    def invoke_agent(self, agentId, agentAliasId, sessionId, inputText, **kwargs):
+        self.calls += 1
+
+        def completion():
+            time.sleep(self.latency)
+            for i in range(self.chunks):
+                if i:
+                    time.sleep(self.chunk_delay)
+                yield {"chunk": {"bytes": f"Analyse partie {i} : éléments chiffrés et conclusion.<br/>".encode("utf-8")}}
+
+        return {"completion": completion(), "sessionId": sessionId}
+
+
+class ArticleServer:
+    """Serveur HTTP local qui sert des articles et rapports SEC générés (et une page bloquée)."""
+
+    def __init__(self, latency=0.0):
+        latency_ref = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency_ref.latency)
+                slug = self.path.strip("/")
+                if slug.endswith("-blocked"):
+                    body = "<p>Thank you for your patience. Our engineers are working quickly to resolve the issue.</p>"
+                elif slug.startswith("filings/"):
+                    body = fixtures.filing_html(slug[len("filings/"):])
+                else:
+                    body = fixtures.article_html(slug)
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.latency = latency
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="article-server", daemon=True)
+
+    def url(self, slug):
+        return f"http://127.0.0.1:{self.server.server_port}/{slug}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,153 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+# Données synthétiques et déterministes utilisées à la place de yfinance
+SEED = 42
+FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+
+def rng_for(symbol):
+    return np.random.default_rng([SEED, zlib.crc32(symbol.encode("utf-8"))])
+
+
+def price_history(symbol, start=None, period="2y", end=None):
+    end = pd.Timestamp(end or pd.Timestamp.today().normalize())
+    if start is not None:
+        start = pd.Timestamp(start)
+    else:
+        days = {"d": 1, "wk": 7, "mo": 31, "y": 366}
+        unit = next(u for u in days if period.endswith(u))
+        start = end - pd.Timedelta(days=int(period[:-len(unit)]) * days[unit])
+    index = pd.bdate_range(start, end, name="Date")
+    # Même trajectoire quel que soit l'intervalle demandé : on part d'une date fixe
+    all_days = pd.bdate_range("2015-01-01", end)
+    rng = rng_for(symbol)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(all_days))))
+    close = pd.Series(close, index=all_days).reindex(index)
+    frame = pd.DataFrame({
+        "Open": close * 0.995,
+        "High": close * 1.01,
+        "Low": close * 0.99,
+        "Close": close,
+        "Adj Close": close,
+        "Volume": rng.integers(1_000_000, 5_000_000, len(index)).astype(float),
+    }, index=index)
+    return frame
+
+
+def info(symbol):
+    rng = rng_for(symbol)
+    return {
+        "symbol": symbol,
+        "longName": f"{symbol} Corporation",
+        "sector": "Technology",
+        "country": "United States",
+        "marketCap": int(rng.integers(10 ** 9, 10 ** 12)),
+        "longBusinessSummary": f"{symbol} Corporation conçoit et vend des produits et services. " * 10,
+        "trailingPE": float(rng.uniform(8, 60)),
+        "priceToSalesTrailing12Months": float(rng.uniform(0.5, 15)),
+        "beta": float(rng.uniform(0.4, 1.8)),
+        "dividendYield": float(rng.uniform(0, 4)),
+        "companyOfficers": [
+            {
+                "maxAge": 1, "name": f"Officer {i}", "age": 50 + i, "title": "Executive",
+                "yearBorn": 1970 + i, "fiscalYear": 2024, "totalPay": 1_000_000 * (i + 1),
+                "exercisedValue": 0, "unexercisedValue": 0,
+            }
+            for i in range(5)
+        ],
+    }
+
+
+def statements(symbol):
+    columns = pd.to_datetime(["2024-12-31", "2023-12-31", "2022-12-31", "2021-12-31"])
+    rng = rng_for(symbol)
+    net_income = rng.uniform(1e8, 1e10, 4)
+    financials = pd.DataFrame([net_income, net_income * 5], index=["Net Income", "Total Revenue"], columns=columns)
+    balance_sheet = pd.DataFrame(
+        [net_income * 12, net_income * 5, net_income * 3],
+        index=["Total Assets", "Stockholders Equity", "Ordinary Shares"], columns=columns,
+    )
+    cashflow = pd.DataFrame([net_income * 1.1], index=["Free Cash Flow"], columns=columns)
+    return financials, balance_sheet, cashflow
+
+
+def dividends(symbol):
+    index = pd.date_range("2023-01-15", periods=8, freq="QS", name="Date")
+    return pd.Series(np.linspace(0.2, 0.3, 8), index=index, name="Dividends")
+
+
+def institutional_holders(symbol):
+    return pd.DataFrame({
+        "Date Reported": pd.to_datetime(["2024-09-30"] * 5),
+        "Holder": [f"Fund {i}" for i in range(5)],
+        "pctHeld": [0.08, 0.06, 0.04, 0.03, 0.02],
+        "Shares": [8e7, 6e7, 4e7, 3e7, 2e7],
+        "Value": [8e9, 6e9, 4e9, 3e9, 2e9],
+    })
+
+
+def sustainability(symbol):
+    return pd.DataFrame({"esgScores": {"totalEsg": 21.5}})
+
+
+def sec_filings(symbol, article_url):
+    filings = []
+    for i in range(6):
+        kind = "10-K" if i % 3 == 0 else "8-K"
+        filings.append({
+            "type": kind,
+            "date": f"2024-0{i + 1}-15",
+            "exhibits": {kind: article_url(f"filings/{symbol}-{kind}-{i}")},
+        })
+    return filings
+
+
+def news(symbol, article_url, count=6):
+    return [
+        {
+            "title": f"{symbol} news {i}",
+            "link": article_url(f"{symbol}-{i}"),
+            "publisher": "Bench Wire",
+        }
+        for i in range(count)
+    ]
+
+
+def article_html(slug, paragraphs=30):
+    body = "".join(
+        f"<p>Paragraph {i} of article {slug}: the company reported revenue growth of {i}% and "
+        f"analysts expect margins to expand over the next quarters.</p>"
+        for i in range(paragraphs)
+    )
+    return (
+        "<html><head><title>Article</title></head><body>"
+        "<nav><p>Home | Markets | Economy | Technology | Politics | Opinion</p></nav>"
+        "<div class='cookie-banner'><p>We use cookies to improve your experience on this site.</p></div>"
+        f"<article>{body}</article>"
+        "<aside class='related'><p>Related: five stocks analysts love this week and why.</p></aside>"
+        "</body></html>"
+    )
+
+
+def filing_html(slug, sections=20):
+    body = "".join(
+        f"<p>Item {i} of filing {slug}: net sales increased {i}% driven by services, while operating "
+        f"expenses and debt repayments affected liquidity and capital resources.</p>"
+        for i in range(sections)
+    )
+    return f"<html><body><div style='display:none'><ix:header>hidden xbrl</ix:header></div>{body}</body></html>"
+
+
+def sp500_tickers(count=50):
+    return [f"T{i:03d}" for i in range(count)]
+
+
+def constituents(count=50):
+    return [
+        {"symbol": symbol, "name": info(symbol)["longName"], "sector": info(symbol)["sector"], "cik": f"{i:010d}"}
+        for i, symbol in enumerate(sp500_tickers(count))
+    ]
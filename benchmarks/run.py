@@ -0,0 +1,251 @@
+"""
+Banc d'essai hors ligne : yfinance, Bedrock et les sites d'actualités sont
+remplacés par des doublures locales (voir fakes.py), puis on chronomètre les
+agents, les graphiques, la construction du PDF, download_report et le rendu
+complet de app3.py. Les résultats sont écrits dans un fichier JSON.
+
+    python -m benchmarks.run --repeat 3 --output bench_results.json
+"""
+import os
+import sys
+import json
+import time
+import itertools
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import date, datetime, timezone
+
+from benchmarks import fixtures
+from benchmarks.fakes import FakeYFinance, FakeBedrockRuntime, FakeAgentRuntime, ArticleServer
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai hors ligne du rapport et du tableau de bord")
+    parser.add_argument("--ticker", default="T000")
+    parser.add_argument("--universe", type=int, default=50, help="nombre de tickers du faux S&P 500")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--yf-latency", type=float, default=0.05, help="latence d'un appel yfinance (s)")
+    parser.add_argument("--model-latency", type=float, default=0.5, help="latence d'invoke_model (s)")
+    parser.add_argument("--agent-latency", type=float, default=1.0, help="délai avant le premier morceau d'un agent (s)")
+    parser.add_argument("--agent-chunks", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    parser.add_argument("--article-latency", type=float, default=0.1)
+    parser.add_argument("--skip-app", action="store_true", help="ne pas mesurer le rendu de app3.py")
+    return parser.parse_args(argv)
+
+
+def configure_environment(cache_dir):
+    # Les modules lisent leur configuration à l'import : à faire avant tout import du projet
+    os.environ.update({
+        "BEDROCK_CACHE_BYPASS": "1",
+        "BEDROCK_CACHE_PATH": os.path.join(cache_dir, "bedrock_responses.sqlite"),
+        "PRICE_STORE_DIR": os.path.join(cache_dir, "prices"),
+        "MACRO_DIGEST_PATH": os.path.join(cache_dir, "macro_digest.json"),
+        "METRICS_PATH": os.path.join(cache_dir, "metrics.npz"),
+        "FUNDAMENTALS_PATH": os.path.join(cache_dir, "fundamentals.json"),
+        "SCREENER_PATH": os.path.join(cache_dir, "screener.npz"),
+        "SCREENER_INFO_PATH": os.path.join(cache_dir, "screener_info.json"),
+        "FILINGS_INDEX_DIR": os.path.join(cache_dir, "filings"),
+        "TELEMETRY_PROM_PATH": os.path.join(cache_dir, "metrics.prom"),
+        "CONSTITUENTS_PATH": os.path.join(cache_dir, "sp500_constituents.json"),
+    })
+    os.environ["NO_PROXY"] = ",".join(filter(None, [os.environ.get("NO_PROXY"), "127.0.0.1", "localhost"]))
+
+
+def install_fakes(args, server):
+    """Branche les doublures dans les modules du projet et retourne les faux clients."""
+    import aws_clients
+    import price_store
+    import chart_utils
+    import bedrock_agents
+    import reportpdf
+    import constituents
+
+    fake_yf = FakeYFinance(latency=args.yf_latency, article_url=server.url)
+    for module in (price_store, chart_utils, bedrock_agents, reportpdf):
+        module.yf = fake_yf
+    tickers = fixtures.sp500_tickers(args.universe)
+    chart_utils.fetch_sp500_tickers = lambda: list(tickers)
+    # Rafraîchissement de la liste des constituants (lancé par app3.py) sans appel à Wikipedia
+    constituents.fetch_from_wikipedia = lambda: constituents.ConstituentRegistry(
+        fixtures.constituents(args.universe), date.today().isoformat(), "bench",
+    )
+
+    runtime = FakeBedrockRuntime(latency=args.model_latency)
+    agent_runtime = FakeAgentRuntime(latency=args.agent_latency, chunks=args.agent_chunks, chunk_delay=args.chunk_delay)
+    aws_clients.register_client("bedrock-runtime", runtime)
+    aws_clients.register_client("bedrock-agent-runtime", agent_runtime)
+    return {"yfinance": fake_yf, "bedrock-runtime": runtime, "bedrock-agent-runtime": agent_runtime}
+
+
+def summarize(durations):
+    return {
+        "runs": [round(d, 4) for d in durations],
+        "min": round(min(durations), 4),
+        "median": round(statistics.median(durations), 4),
+        "max": round(max(durations), 4),
+    }
+
+
+def measure(results, name, func, repeat, before=None):
+    durations = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    results[name] = summarize(durations)
+    print(f"{name:<32} médiane {results[name]['median']:.3f}s (min {results[name]['min']:.3f}s)")
+    return results[name]
+
+
+def clear_chart_cache():
+    import reportpdf
+
+    with reportpdf._chart_lock:
+        reportpdf._chart_cache.clear()
+        reportpdf._chart_key_locks.clear()
+
+
+def bench_setup(args, results):
+    """Remplit les stockages locaux comme le feraient les tâches de fond en production."""
+    import price_store
+    import metrics_engine
+    import screener
+    import chart_utils
+    from macro_digest import refresh_macro_digest
+
+    universe = chart_utils.fetch_sp500_tickers()
+    measure(results, "setup.price_sync", lambda: price_store.sync(universe + price_store.MACRO_SYMBOLS), 1)
+    measure(results, "setup.metrics", lambda: metrics_engine.refresh_universe(universe), 1)
+    measure(results, "setup.screener", lambda: screener.refresh_index(universe), 1)
+    measure(results, "setup.macro_digest", refresh_macro_digest, 1)
+
+
+def bench_agents(args, results):
+    import bedrock_agents as agents
+
+    ticker = args.ticker
+    news = agents.get_news_with_sentiment(ticker)
+    macro = agents.get_macro_news()
+    measure(results, "agents.get_news_with_sentiment", lambda: agents.get_news_with_sentiment(ticker), args.repeat)
+    measure(results, "agents.get_macro_news", agents.get_macro_news, args.repeat)
+    measure(results, "agents.gat_analyse_macro", lambda: agents.gat_analyse_macro(macro), args.repeat)
+    measure(results, "agents.profil_resp_data", lambda: agents.profil_resp_data(ticker), args.repeat)
+    measure(results, "agents.finance_resp_data", lambda: agents.finance_resp_data(ticker), args.repeat)
+    measure(results, "agents.sentiment_anal", lambda: agents.sentiment_anal(ticker, news), args.repeat)
+    measure(results, "agents.holders_anal", lambda: agents.holders_anal(ticker), args.repeat)
+    measure(results, "agents.risk_anal", lambda: agents.risk_anal(ticker, macro), args.repeat)
+    measure(results, "agents.tot_anal", lambda: agents.tot_anal(ticker, "risque", "profil", macro, "finance", "sentiment"), args.repeat)
+
+
+def bench_charts(args, results):
+    import reportpdf
+
+    measure(results, "charts.inflation", reportpdf.create_inflation_chart, args.repeat, before=clear_chart_cache)
+    measure(results, "charts.vix", reportpdf.create_vix_chart, args.repeat, before=clear_chart_cache)
+    measure(results, "charts.price", lambda: reportpdf.create_price_chart(args.ticker), args.repeat, before=clear_chart_cache)
+    measure(results, "charts.cached", lambda: reportpdf.create_price_chart(args.ticker), args.repeat)
+
+
+def bench_report(args, results):
+    import reportpdf
+
+    stages = {}
+
+    def record(name, duration):
+        stages.setdefault(name, []).append(duration)
+
+    # Graphiques et synthèse macro déjà prêts, comme sur le serveur en régime établi
+    measure(results, "report.download_report", lambda: reportpdf.download_report(args.ticker, on_stage_done=record), args.repeat)
+    measure(
+        results, "report.download_report_cold_charts",
+        lambda: reportpdf.download_report(args.ticker), args.repeat, before=clear_chart_cache,
+    )
+    for name, durations in stages.items():
+        results[f"report.stage.{name}"] = summarize(durations)
+    results["report.pdf_build"] = results["report.stage.pdf"]
+
+
+def bench_app(args, results, fakes):
+    from streamlit.testing.v1 import AppTest
+
+    app_path = os.path.join(REPO_DIR, "app3.py")
+    state = {}
+
+    def first_render():
+        state["app"] = AppTest.from_file(app_path, default_timeout=120)
+        state["app"].run()
+        if state["app"].exception:
+            raise RuntimeError(state["app"].exception[0].message)
+
+    def rerun():
+        state["app"].run()
+
+    # Une question différente par tour : sinon le cache des réponses du chat répondrait
+    questions = iter(f"Quelles sont les perspectives de la zone {zone} ?" for zone in itertools.count(1000))
+
+    def chat_turn():
+        state["app"].chat_input[0].set_value(next(questions)).run()
+
+    def chat_turn_cached():
+        state["app"].chat_input[0].set_value("Quelles sont les perspectives de la zone 1000 ?").run()
+
+    yf_calls = fakes["yfinance"].calls
+    measure(results, "app.first_render", first_render, args.repeat)
+    measure(results, "app.rerun", rerun, args.repeat)
+    before = sum(yf_calls.values())
+    measure(results, "app.chat_turn", chat_turn, args.repeat)
+    results["app.chat_turn"]["yfinance_calls"] = sum(yf_calls.values()) - before
+    measure(results, "app.chat_turn_cached", chat_turn_cached, args.repeat)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_path = os.path.abspath(args.output)
+    cache_dir = tempfile.mkdtemp(prefix="bench-cache-")
+    configure_environment(cache_dir)
+    # app3.py et le logo du rapport sont résolus depuis la racine du dépôt
+    os.chdir(REPO_DIR)
+    sys.path.insert(0, REPO_DIR)
+
+    results = {}
+    try:
+        with ArticleServer(latency=args.article_latency) as server:
+            fakes = install_fakes(args, server)
+            bench_setup(args, results)
+            bench_agents(args, results)
+            bench_charts(args, results)
+            bench_report(args, results)
+            if not args.skip_app:
+                bench_app(args, results, fakes)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    output = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "calls": {
+            "yfinance": fakes["yfinance"].calls,
+            "invoke_model": fakes["bedrock-runtime"].calls,
+            "invoke_agent": fakes["bedrock-agent-runtime"].calls,
+        },
+        "results": results,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Résultats écrits dans {output_path}")
+
+
+if __name__ == "__main__":
+    main()
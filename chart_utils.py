@@ -1,12 +1,121 @@
+import time
+import threading
+
 import streamlit as st
 import yfinance as yf
+import pandas as pd
+
+import price_store
+import metrics_engine
+import constituents
+from telemetry import span
+from rate_limit import limited
+
+
+# Durée de validité (en secondes) de chaque donnée d'un snapshot
+SNAPSHOT_TTL = {
+    "info": 15 * 60,
+    "history": 15 * 60,
+    "financials": 24 * 3600,
+    "balance_sheet": 24 * 3600,
+    "sustainability": 24 * 3600,
+    "dividends": 6 * 3600,
+    "institutional_holders": 6 * 3600,
+    "sec_filings": 6 * 3600,
+}
+
+
+class TickerSnapshot:
+    """
+    Données yfinance d'un ticker, chargées une seule fois par champ puis
+    conservées pendant la durée définie dans SNAPSHOT_TTL.
+    """
+
+    def __init__(self, symbol, ttl=None):
+        self.symbol = symbol
+        self.ticker = yf.Ticker(symbol)
+        self.ttl = dict(SNAPSHOT_TTL, **(ttl or {}))
+        self._values = {}  # champ -> (date de chargement, valeur)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _field_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _get(self, key, ttl, loader):
+        # Un verrou par champ : deux appels simultanés ne font qu'un seul téléchargement
+        with self._field_lock(key):
+            cached = self._values.get(key)
+            if cached is not None and time.time() - cached[0] < ttl:
+                return cached[1]
+            with span("yfinance", key, symbol=self.symbol):
+                value = limited("yfinance", loader)
+            self._values[key] = (time.time(), value)
+            return value
+
+    def get(self, field):
+        return self._get(field, self.ttl[field], lambda: getattr(self.ticker, field))
+
+    def history(self, period="2y"):
+        return self._get(f"history_{period}", self.ttl["history"], lambda: self.ticker.history(period=period))
+
+    def invalidate(self, field=None):
+        with self._lock:
+            if field is None:
+                self._values.clear()
+            else:
+                self._values.pop(field, None)
+
+    @property
+    def info(self):
+        return self.get("info")
+
+    @property
+    def financials(self):
+        return self.get("financials")
+
+    @property
+    def balance_sheet(self):
+        return self.get("balance_sheet")
+
+    @property
+    def sustainability(self):
+        return self.get("sustainability")
+
+    @property
+    def dividends(self):
+        return self.get("dividends")
+
+    @property
+    def institutional_holders(self):
+        return self.get("institutional_holders")
+
+    @property
+    def sec_filings(self):
+        return self.get("sec_filings")
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
 
+def get_snapshot(symbol):
+    """Retourne le snapshot partagé du ticker (créé au premier appel)."""
+    with _snapshots_lock:
+        if symbol not in _snapshots:
+            _snapshots[symbol] = TickerSnapshot(symbol)
+        return _snapshots[symbol]
+
+
+# Liste des tickers du S&P 500 (registre local, rafraîchi depuis Wikipedia en arrière-plan)
+def fetch_sp500_tickers():
+    return constituents.get_tickers()
 
 
 # Fonction pour récupérer les rapports 10-K et 8-K pour un ticker donné
 def get_rapport(ticker_symbole):
-    ticker = yf.Ticker(ticker_symbole)
-    info_sec = ticker.sec_filings
+    info_sec = get_snapshot(ticker_symbole).sec_filings
     dico_10_K = {}
     dico_8_K = {}
     for i in info_sec:
@@ -18,47 +127,72 @@ def get_rapport(ticker_symbole):
             continue
     return dico_10_K, dico_8_K
 
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def market_frame(Ticker, period="2y"):
+    """Historique OHLCV du ticker, lu depuis le stockage local des prix (voir price_store)."""
+    return price_store.read_frame(Ticker, period)
+
+
+def window_to_arrays(window):
+    # Colonnes du tableau structuré : vues sur le fichier mappé, sans copie
+    arrays = {"Date": window["date"]}
+    for field, column in price_store.FRAME_COLUMNS.items():
+        if column in OHLCV_COLUMNS:
+            arrays[column] = window[field]
+    return arrays
+
+
+def market_arrays(tickers, period="2y"):
+    """
+    Historique OHLCV d'un ou plusieurs tickers sous forme de tableaux NumPy.
+
+    Parameters:
+        tickers (str | list): un ticker, ou une liste synchronisée en une seule requête.
+        period (str): période yfinance.
+
+    Returns:
+        dict: {"Date", "Open", ..., "Volume"} pour un ticker,
+        {ticker: {"Date", ...}} pour une liste.
+    """
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+    price_store.ensure_fresh(symbols)
+    start = price_store.period_start(period)
+    result = {
+        symbol: window_to_arrays(price_store.read_window(symbol, start=start, refresh=False))
+        for symbol in symbols
+    }
+    return result[tickers] if isinstance(tickers, str) else result
+
+
 def market_data(Ticker, info="Close"):
-    ticker=yf.Ticker(Ticker)
-    sortie=ticker.history(period="2y")
-    sortie=sortie[info]
-    return sortie.tolist()
+    return market_frame(Ticker)[info].to_numpy()
 
 def esg_info(Ticker:str ):
-    ticker=yf.Ticker(Ticker)
-    sortie=ticker.sustainability
+    sortie=get_snapshot(Ticker).sustainability
     sortie=sortie.to_dict()
     sortie=sortie["esgScores"]["totalEsg"]
     return sortie
 
 def get_latest_roa(ticker: str):
-    company = yf.Ticker(ticker)
-    
-    financials = company.financials
-    balance_sheet = company.balance_sheet
-    if financials is not None and balance_sheet is not None:
-        latest_year = financials.columns[0]
-        net_income = financials.loc['Net Income'][latest_year]
-        total_assets = balance_sheet.loc['Total Assets'][latest_year]    
-        roa = (net_income / total_assets) * 100
-        return roa
-    else:
-        return 
+    # ROA (%) lu dans le moteur de métriques (voir metrics_engine)
+    return metrics_engine.ticker_metrics(ticker)["roa"]
 
 def get_latest_pe_ratio(ticker: str):
 
-    company = yf.Ticker(ticker)
+    company = get_snapshot(ticker)
     pe_ratio = company.info.get('trailingPE')
     return pe_ratio
 
 def get_latest_ps_ratio(ticker: str):
 
-    company = yf.Ticker(ticker)
+    company = get_snapshot(ticker)
     ps_ratio = company.info.get('priceToSalesTrailing12Months')
     return ps_ratio
 
 def get_beta( Tricker : str):
-    company= yf.Ticker(Tricker)
+    company= get_snapshot(Tricker)
     return company.info.get('beta')
 
 def get_roe(ticker):
@@ -71,46 +205,15 @@ def get_roe(ticker):
     Returns:
         float: Le ROE de l'entreprise, ou None si la valeur n'est pas disponible.
     """
-    try:
-        # Récupérer les données de l'entreprise
-        stock = yf.Ticker(ticker)
-
-        # Récupérer le bilan et le compte de résultat
-        balance_sheet = stock.balance_sheet
-        income_statement = stock.financials
-
-
-        # Vérifier si les données nécessaires sont disponibles
-        if 'Net Income' in income_statement.index:
-            net_income = income_statement.loc['Net Income'].iloc[0]  # Bénéfice net
-            
-            # Essayer d'accéder à 'Total Stockholder Equity' ou à d'autres lignes potentielles
-            if 'Total Stockholder Equity' in balance_sheet.index:
-                total_equity = balance_sheet.loc['Total Stockholder Equity'].iloc[0]
-            elif 'Ordinary Shares' in balance_sheet.index:
-                total_equity = balance_sheet.loc['Ordinary Shares'].iloc[0]
-            elif 'Total Assets' in balance_sheet.index:
-                total_equity = balance_sheet.loc['Total Assets'].iloc[0]  # Vérification alternative
-            else:
-                print("Aucune ligne appropriée pour les capitaux propres trouvée.")
-                return None
-            
-            # Calculer le ROE
-            roe = net_income / total_equity
-            return roe
-        else:
-            print("Bénéfice net non disponible pour le ticker:", ticker)
-            return None
-    except Exception as e:
-        print("Une erreur s'est produite:", e)
-        return None
+    # Valeur calculée pour tout l'univers en une passe (voir metrics_engine)
+    return metrics_engine.ticker_metrics(ticker)["roe"]
     
 
 
 
 # Fonction pour obtenir les 8 derniers dividendes d'une entreprise
 def get_last_dividends(ticker_symbol, num_dividends=8):
-    ticker = yf.Ticker(ticker_symbol)
+    ticker = get_snapshot(ticker_symbol)
     dividends = ticker.dividends  # Récupérer les dividendes historiques
     
     # Vérifier s'il y a des données disponibles
@@ -125,7 +228,7 @@ def get_last_dividends(ticker_symbol, num_dividends=8):
     return last_dividends
 # Fonction pour obtenir les principaux détenteurs de l'entreprise
 def get_top_holders(ticker_symbol):
-    ticker = yf.Ticker(ticker_symbol)
+    ticker = get_snapshot(ticker_symbol)
     top_holders = ticker.institutional_holders  # Récupérer les top holders
     
     # Vérifier s'il y a des données disponibles
@@ -0,0 +1,222 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import filings_index
+from answer_cache import SemanticAnswerCache
+from articles import estimate_tokens
+from bedrock_agents import stream_agent_with_prompt, truncate_tokens
+from telemetry import span
+
+
+logger = logging.getLogger(__name__)
+
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "20"))  # tours de chat traités en même temps, tous utilisateurs
+CHAT_SESSION_MAX_TURNS = int(os.getenv("CHAT_SESSION_MAX_TURNS", "10"))  # tours par session d'agent
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "4"))
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1000"))
+CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", str(2 * 3600)))  # session inactive oubliée
+CHAT_MAX_TURNS = 50  # tours conservés pour l'affichage
+
+PENDING = "en attente"
+RUNNING = "en cours"
+DONE = "terminé"
+FAILED = "échec"
+
+
+class ChatTurn:
+    """Une question et sa réponse, reçue morceau par morceau depuis le pool."""
+
+    def __init__(self, question, ticker=None):
+        self.id = str(uuid.uuid4())
+        self.question = question
+        self.ticker = ticker
+        self.prompt = None
+        self.cached = None  # {"question", "similarity"} si la réponse vient du cache
+        self.status = PENDING
+        self.chunks = []
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def text(self):
+        with self._changed:
+            return "".join(self.chunks)
+
+    def append(self, chunk):
+        with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    def finish(self, status, error=None):
+        with self._changed:
+            self.status = status
+            self.error = error
+            self.finished = time.time()
+            self._changed.notify_all()
+
+    def stream(self):
+        """Morceaux déjà reçus puis les suivants, jusqu'à la fin de la réponse (pour st.write_stream)."""
+        sent = 0
+        while True:
+            with self._changed:
+                while len(self.chunks) == sent and not self.done:
+                    self._changed.wait()
+                new = self.chunks[sent:]
+                sent = len(self.chunks)
+                finished = self.done
+            yield from new
+            if finished and sent == len(self.chunks):
+                return
+
+
+def chat_prompt(question, ticker):
+    """Question, ticker sélectionné et passages pertinents de ses rapports SEC (voir filings_index)."""
+    if not ticker:
+        return question
+    prompt = question + f" Compagny Ticker ({ticker})."
+    with span("retrieval", "filings", symbol=ticker) as retrieval_span:
+        passages = filings_index.search(ticker, question)
+        context = filings_index.format_passages(passages)
+        retrieval_span.set(passages=len(passages), context_tokens=estimate_tokens(context) if context else 0)
+    if context:
+        prompt += f"\n\nExtraits des derniers rapports SEC de {ticker} (à utiliser s'ils sont pertinents) :\n{context}"
+    return prompt
+
+
+class ChatSession:
+    """
+    Conversation d'un utilisateur : sa propre session d'agent Bedrock et sa file de
+    tours, traités dans l'ordre. La session d'agent est renouvelée tous les
+    CHAT_SESSION_MAX_TURNS tours avec un court historique, pour borner la mémoire
+    renvoyée à l'agent.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.agent_session_id = str(uuid.uuid4())
+        self.agent_turns = 0
+        self.turns = deque(maxlen=CHAT_MAX_TURNS)
+        self.last_used = time.time()
+        self._queue = deque()
+        self._running = False
+        self._lock = threading.Lock()
+
+    def list_turns(self):
+        with self._lock:
+            return list(self.turns)
+
+    def history(self, max_turns=CHAT_HISTORY_TURNS, max_tokens=CHAT_HISTORY_TOKENS):
+        """Derniers échanges terminés, du plus ancien au plus récent, dans la limite de max_tokens."""
+        lines = []
+        budget = max_tokens
+        done = [turn for turn in self.turns if turn.status == DONE]
+        for turn in reversed(done[-max_turns:]):
+            exchange = f"Utilisateur : {turn.question}\nAssistant : {turn.text}"
+            exchange = truncate_tokens(exchange, budget)
+            if not exchange:
+                break
+            lines.insert(0, exchange)
+            budget -= estimate_tokens(exchange)
+            if budget <= 0:
+                break
+        return "\n\n".join(lines)
+
+    def next_call(self, turn):
+        """Session d'agent et prompt du tour ; change de session quand elle est pleine."""
+        with self._lock:
+            prompt = turn.prompt
+            if self.agent_turns >= CHAT_SESSION_MAX_TURNS:
+                self.agent_session_id = str(uuid.uuid4())
+                self.agent_turns = 0
+                history = self.history()
+                if history:
+                    prompt = f"Historique récent de la conversation :\n{history}\n\nQuestion : {prompt}"
+            self.agent_turns += 1
+            return self.agent_session_id, prompt
+
+
+class ChatSessionManager:
+    """
+    Sessions de chat de tous les utilisateurs. submit() retourne immédiatement le
+    tour ; un pool partagé appelle l'agent, un seul tour à la fois par utilisateur
+    pour garder l'ordre de sa conversation. Une question proche d'une question
+    déjà posée sur le même ticker reçoit tout de suite la réponse en cache.
+    """
+
+    def __init__(self, agent_alias, max_workers=CHAT_WORKERS, session_ttl=CHAT_SESSION_TTL):
+        self.agent_alias = agent_alias
+        self.session_ttl = session_ttl
+        self.answer_cache = SemanticAnswerCache()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chat")
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, user_id):
+        with self._lock:
+            self._cleanup()
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = self._sessions[user_id] = ChatSession(user_id)
+            session.last_used = time.time()
+            return session
+
+    def submit(self, user_id, question, ticker=None):
+        session = self.get_session(user_id)
+        turn = ChatTurn(question, ticker)
+        hit = self.answer_cache.lookup(ticker, question) if ticker else None
+        if hit is not None:
+            turn.cached = {"question": hit["question"], "similarity": hit["similarity"]}
+            turn.append(hit["answer"])
+            turn.finish(DONE)
+        with session._lock:
+            session.turns.append(turn)
+            if hit is not None:
+                return turn
+            session._queue.append(turn)
+            start = not session._running
+            session._running = True
+        if start:
+            self._executor.submit(self._drain, session)
+        return turn
+
+    def _drain(self, session):
+        while True:
+            with session._lock:
+                if not session._queue:
+                    session._running = False
+                    return
+                turn = session._queue.popleft()
+            self._run(session, turn)
+
+    def _run(self, session, turn):
+        turn.status = RUNNING
+        try:
+            # Recherche faite dans le pool : l'affichage n'attend pas
+            turn.prompt = chat_prompt(turn.question, turn.ticker)
+            agent_session_id, prompt = session.next_call(turn)
+            # Pas de cache : la réponse dépend de la mémoire de la session d'agent
+            for chunk in stream_agent_with_prompt(prompt, self.agent_alias, session=agent_session_id, use_cache=False):
+                turn.append(chunk)
+            turn.finish(DONE if turn.chunks else FAILED)
+            if turn.status == DONE and turn.ticker:
+                self.answer_cache.store(turn.ticker, turn.question, turn.text)
+        except Exception as e:
+            logger.error("Échec du tour de chat (%s) : %s", session.user_id, e)
+            turn.finish(FAILED, str(e))
+
+    def _cleanup(self):
+        now = time.time()
+        for user_id, session in list(self._sessions.items()):
+            if now - session.last_used > self.session_ttl and not session._running:
+                del self._sessions[user_id]
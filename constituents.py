@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+import threading
+from io import StringIO
+from datetime import date
+
+import pandas as pd
+import requests
+
+from file_utils import atomic_write
+from scheduler import start_periodic
+
+
+logger = logging.getLogger(__name__)
+
+# Liste des constituants du S&P 500 : instantané livré avec l'application (chargé sans
+# appel réseau au démarrage), remplacé par la copie rafraîchie depuis Wikipedia si elle existe
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sp500_constituents.json")
+CONSTITUENTS_PATH = os.getenv("CONSTITUENTS_PATH", os.path.join(".cache", "sp500_constituents.json"))
+CONSTITUENTS_INTERVAL = int(os.getenv("CONSTITUENTS_INTERVAL", str(24 * 3600)))
+WIKIPEDIA_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+WIKIPEDIA_TIMEOUT = 10
+RETRY_DELAY = 3600
+MIN_CONSTITUENTS = 450  # en dessous, la page récupérée est jugée incomplète
+
+# Colonnes du tableau Wikipedia -> champs du registre
+WIKIPEDIA_COLUMNS = {"Symbol": "symbol", "Security": "name", "GICS Sector": "sector", "CIK": "cik"}
+
+_registry = None
+_registry_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+class ConstituentRegistry:
+    """Constituants (symbole, nom, secteur GICS, CIK) indexés par symbole et par secteur."""
+
+    def __init__(self, constituents, updated=None, source=None):
+        self.constituents = list(constituents)
+        self.updated = updated
+        self.source = source
+        self.by_symbol = {c["symbol"]: c for c in self.constituents}
+        self.by_sector = {}
+        for c in self.constituents:
+            self.by_sector.setdefault(c["sector"], []).append(c["symbol"])
+
+    def __len__(self):
+        return len(self.constituents)
+
+    def symbols(self):
+        return [c["symbol"] for c in self.constituents]
+
+    def get(self, symbol):
+        return self.by_symbol.get(symbol)
+
+    def to_dict(self):
+        return {"updated": self.updated, "source": self.source, "constituents": self.constituents}
+
+
+def read_registry(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return ConstituentRegistry(data["constituents"], data.get("updated"), data.get("source"))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Liste des constituants illisible (%s) : %s", path, e)
+        return None
+
+
+def save_registry(registry, path=CONSTITUENTS_PATH):
+    atomic_write(path, lambda f: json.dump(registry.to_dict(), f, ensure_ascii=False))
+
+
+def get_registry():
+    """Registre courant : copie rafraîchie sur disque, sinon instantané livré (aucun appel réseau)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            if os.path.exists(CONSTITUENTS_PATH):
+                _registry = read_registry(CONSTITUENTS_PATH)
+            if _registry is None:
+                _registry = read_registry(BUNDLED_PATH) or ConstituentRegistry([])
+        return _registry
+
+
+def fetch_from_wikipedia():
+    response = requests.get(WIKIPEDIA_URL, timeout=WIKIPEDIA_TIMEOUT, headers={"User-Agent": "Mozilla/5.0"})
+    response.raise_for_status()
+    table = pd.read_html(StringIO(response.text))[0]
+    table = table[list(WIKIPEDIA_COLUMNS)].rename(columns=WIKIPEDIA_COLUMNS)
+    table["cik"] = table["cik"].astype(str).str.zfill(10)
+    constituents = table.astype(str).to_dict("records")
+    if len(constituents) < MIN_CONSTITUENTS:
+        raise ValueError(f"seulement {len(constituents)} constituants trouvés")
+    return ConstituentRegistry(constituents, date.today().isoformat(), "wikipedia")
+
+
+def refresh_constituents():
+    """Télécharge la liste depuis Wikipedia, l'enregistre et remplace le registre en mémoire."""
+    global _registry
+    with _refresh_lock:
+        registry = fetch_from_wikipedia()
+        save_registry(registry)
+        with _registry_lock:
+            previous, _registry = _registry, registry
+        if previous is not None:
+            added = set(registry.by_symbol) - set(previous.by_symbol)
+            removed = set(previous.by_symbol) - set(registry.by_symbol)
+            if added or removed:
+                logger.info("Constituants mis à jour : +%s -%s", sorted(added), sorted(removed))
+        return registry
+
+
+def is_stale(registry, max_age=CONSTITUENTS_INTERVAL):
+    if not registry.updated:
+        return True
+    age = time.time() - time.mktime(date.fromisoformat(registry.updated).timetuple())
+    return age >= max_age
+
+
+def start_constituents_refresh(interval=CONSTITUENTS_INTERVAL):
+    """Rafraîchit la liste en arrière-plan (immédiatement si elle est plus vieille que interval)."""
+    def refresh_if_stale():
+        if is_stale(get_registry(), interval):
+            refresh_constituents()
+
+    # Après un échec on garde la liste actuelle et on réessaie plus tôt
+    return start_periodic("constituents", interval, refresh_if_stale, retry_delay=min(interval, RETRY_DELAY))
+
+
+def get_tickers():
+    return get_registry().symbols()
+
+
+def get_constituent(symbol):
+    """{"symbol", "name", "sector", "cik"} du symbole, ou None s'il n'est pas dans l'indice."""
+    return get_registry().get(symbol)
+
+
+def get_sector(symbol):
+    constituent = get_constituent(symbol)
+    return constituent["sector"] if constituent else None
+
+
+def get_sectors():
+    """Secteur GICS -> symboles."""
+    return dict(get_registry().by_sector)
@@ -0,0 +1,83 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import streamlit as st
+
+import filings_index
+import metrics_engine
+import price_store
+from chart_utils import (
+    SNAPSHOT_TTL, get_snapshot, get_rapport, market_arrays, esg_info, get_beta,
+    get_latest_pe_ratio, get_latest_ps_ratio, get_last_dividends, get_top_holders,
+)
+from telemetry import propagate
+
+
+logger = logging.getLogger(__name__)
+
+# Données du tableau de bord, mises en cache par ticker entre les reruns de Streamlit :
+# un message de chat ou un changement de ticker déjà vu ne refait aucun appel réseau
+MARKET_TTL = SNAPSHOT_TTL["history"]
+INDICATORS_TTL = SNAPSHOT_TTL["info"]
+FILINGS_TTL = SNAPSHOT_TTL["sec_filings"]
+TABLES_TTL = SNAPSHOT_TTL["dividends"]
+
+PREFETCH_FIELDS = ["info", "sustainability", "sec_filings", "dividends", "institutional_holders"]
+
+
+def safe(func, *args):
+    """Valeur de func(*args), ou None si la donnée n'est pas disponible pour ce ticker."""
+    try:
+        return func(*args)
+    except Exception as e:
+        logger.warning("%s indisponible pour %s : %s", func.__name__, args[0] if args else "", e)
+        return None
+
+
+def prefetch_ticker(ticker):
+    """Charge en parallèle les champs yfinance et les prix d'un ticker (premier affichage)."""
+    snapshot = get_snapshot(ticker)
+    tasks = [lambda field=field: snapshot.get(field) for field in PREFETCH_FIELDS]
+    tasks.append(lambda: price_store.ensure_fresh([ticker]))
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="prefetch") as executor:
+        for future in [executor.submit(propagate(task)) for task in tasks]:
+            if future.exception() is not None:
+                logger.warning("Préchargement incomplet pour %s : %s", ticker, future.exception())
+    # Index des rapports SEC pour le chat : construit en arrière-plan, sans attendre
+    filings_index.schedule_update(ticker)
+
+
+@st.cache_data(ttl=FILINGS_TTL, show_spinner=False)
+def load_filings(ticker):
+    return safe(get_rapport, ticker) or ({}, {})
+
+
+@st.cache_data(ttl=MARKET_TTL, show_spinner=False)
+def load_market(ticker, period="2y"):
+    # Copie des vues mappées : le cache doit pouvoir sérialiser le résultat
+    return {column: np.array(values) for column, values in market_arrays(ticker, period).items()}
+
+
+@st.cache_data(ttl=INDICATORS_TTL, show_spinner=False)
+def load_indicators(ticker):
+    metrics = safe(metrics_engine.ticker_metrics, ticker) or {}
+    return {
+        "esg": safe(esg_info, ticker),
+        "beta": safe(get_beta, ticker),
+        "pe": safe(get_latest_pe_ratio, ticker),
+        "ps": safe(get_latest_ps_ratio, ticker),
+        "roa": metrics.get("roa"),
+        "roe": metrics.get("roe"),
+        "return": metrics.get("return"),
+        "r_squared": metrics.get("r_squared"),
+        "cagr": metrics.get("cagr"),
+    }
+
+
+@st.cache_data(ttl=TABLES_TTL, show_spinner=False)
+def load_tables(ticker):
+    return {
+        "dividends": safe(get_last_dividends, ticker),
+        "holders": safe(get_top_holders, ticker),
+    }
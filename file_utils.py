@@ -0,0 +1,24 @@
+import os
+import uuid
+
+
+def atomic_write(path, writer, mode="w"):
+    """
+    Écrit path avec writer(f) dans un fichier temporaire du même dossier, puis le renomme :
+    un lecteur ne voit jamais un fichier à moitié écrit, et deux écrivains ne partagent
+    pas le même fichier temporaire. Retourne la valeur de writer.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    encoding = None if "b" in mode else "utf-8"
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            result = writer(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return result
@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from urllib.parse import quote, urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from articles import get_session, make_soup, estimate_tokens
+from bedrock_agents import truncate_tokens
+from chart_utils import get_snapshot
+from file_utils import atomic_write
+from rate_limit import limited
+from telemetry import span, propagate
+from text_vectors import DIMENSIONS, vectorize, to_dense
+
+
+logger = logging.getLogger(__name__)
+
+# Index local des rapports SEC (10-K, 8-K) de chaque ticker : documents découpés en passages,
+# vectorisés par hachage (voir text_vectors) et enregistrés dans un fichier .npz par ticker.
+# Seuls les nouveaux dépôts sont téléchargés à chaque mise à jour.
+FILINGS_INDEX_DIR = os.getenv("FILINGS_INDEX_DIR", os.path.join(".cache", "filings"))
+FILINGS_INDEX_MAX_AGE = int(os.getenv("FILINGS_INDEX_MAX_AGE", str(6 * 3600)))  # comme sec_filings (chart_utils)
+FILINGS_TOP_K = int(os.getenv("FILINGS_TOP_K", "4"))
+FILINGS_CONTEXT_TOKENS = int(os.getenv("FILINGS_CONTEXT_TOKENS", "800"))  # passages joints à un tour de chat
+SEC_USER_AGENT = os.getenv("SEC_USER_AGENT", "financial-adviser admin@example.com")  # exigé par sec.gov
+
+FILING_TYPES = {"10-K": 2, "8-K": 8}  # type -> nombre de dépôts récents indexés
+FILING_MAX_BYTES = 20 * 1024 * 1024
+FILING_TIMEOUT = (5, 60)
+DOWNLOAD_WORKERS = 4
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+MIN_SCORE = 0.05
+HIDDEN_TAGS = ["script", "style", "ix:header"]  # ix:header : données XBRL masquées des rapports inline
+
+_indexes = {}
+_index_locks = {}
+_lock = threading.Lock()
+_updater = ThreadPoolExecutor(max_workers=2, thread_name_prefix="filings")
+_scheduled = set()
+
+
+class FilingsIndex:
+    """
+    Passages des rapports d'un ticker et leurs vecteurs, stockés en matrice creuse
+    (indices, valeurs, pointeurs de ligne) pour un calcul de similarité en NumPy.
+    """
+
+    def __init__(self, ticker, documents=None, chunks=None, indices=None, values=None, indptr=None, updated=None):
+        self.ticker = ticker
+        self.documents = documents or []  # {"url", "type", "exhibit", "date"}
+        self.chunks = chunks or []  # {"doc": position dans documents, "text"}
+        self.indices = np.zeros(0, dtype=np.int32) if indices is None else indices
+        self.values = np.zeros(0, dtype=np.float32) if values is None else values
+        self.indptr = np.zeros(1, dtype=np.int64) if indptr is None else indptr
+        self.updated = updated
+        self._idf = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def urls(self):
+        return {document["url"] for document in self.documents}
+
+    @property
+    def idf(self):
+        # Fréquence des colonnes dans les passages : les termes rares pèsent plus dans la requête
+        if self._idf is None:
+            df = np.bincount(self.indices, minlength=DIMENSIONS)
+            self._idf = (np.log((len(self) + 1) / (df + 1)) + 1).astype(np.float32)
+        return self._idf
+
+    def with_documents(self, parsed):
+        """Nouvel index avec les documents parsed ([(document, [passages])]) ajoutés à la fin."""
+        documents = list(self.documents)
+        chunks = list(self.chunks)
+        indices = [self.indices]
+        values = [self.values]
+        lengths = []
+        for document, texts in parsed:
+            documents.append(document)
+            for text in texts:
+                chunk_indices, chunk_values = vectorize(text)
+                if not len(chunk_indices):
+                    continue
+                chunks.append({"doc": len(documents) - 1, "text": text})
+                indices.append(chunk_indices)
+                values.append(chunk_values)
+                lengths.append(len(chunk_indices))
+        indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths, dtype=np.int64)])
+        return FilingsIndex(self.ticker, documents, chunks, np.concatenate(indices), np.concatenate(values), indptr, self.updated)
+
+    def search(self, question, k=FILINGS_TOP_K, min_score=MIN_SCORE):
+        """Les k passages les plus proches de la question (cosinus), du plus au moins pertinent."""
+        query_indices, query_values = vectorize(question)
+        if not len(self) or not len(query_indices):
+            return []
+        query = to_dense(query_indices, query_values, self.idf)
+        # Produit scalaire de chaque passage avec la requête, ligne par ligne de la matrice creuse
+        scores = np.add.reduceat(self.values * query[self.indices], self.indptr[:-1])
+        top = np.argsort(-scores)[:k]
+        passages = []
+        for position in top:
+            if scores[position] < min_score:
+                break
+            chunk = self.chunks[position]
+            passages.append(dict(self.documents[chunk["doc"]], text=chunk["text"], score=float(scores[position])))
+        return passages
+
+    def save(self, path):
+        meta = {"ticker": self.ticker, "updated": self.updated, "documents": self.documents, "chunks": self.chunks}
+        # Un seul fichier : la matrice et les passages restent cohérents
+        atomic_write(path, lambda f: np.savez(
+            f, indices=self.indices, values=self.values, indptr=self.indptr, meta=np.array(json.dumps(meta)),
+        ), "wb")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(meta["ticker"], meta["documents"], meta["chunks"], data["indices"], data["values"], data["indptr"], meta["updated"])
+
+
+def index_path(ticker):
+    return os.path.join(FILINGS_INDEX_DIR, quote(ticker, safe="") + ".npz")
+
+
+def ticker_lock(ticker):
+    with _lock:
+        return _index_locks.setdefault(ticker, threading.Lock())
+
+
+def list_documents(ticker):
+    """Document principal des 10-K / 8-K récents et communiqués (EX-99) joints aux 8-K."""
+    filings = sorted(get_snapshot(ticker).sec_filings or [], key=lambda f: str(f.get("date")), reverse=True)
+    counts = {}
+    documents = []
+    for filing in filings:
+        kind = filing.get("type")
+        if kind not in FILING_TYPES or counts.get(kind, 0) >= FILING_TYPES[kind]:
+            continue
+        counts[kind] = counts.get(kind, 0) + 1
+        for exhibit, url in (filing.get("exhibits") or {}).items():
+            if exhibit == kind or (kind == "8-K" and exhibit.startswith("EX-99")):
+                documents.append({"url": url, "type": kind, "exhibit": exhibit, "date": str(filing.get("date"))})
+    return documents
+
+
+def download_text(url):
+    def download():
+        with get_session().get(url, headers={"User-Agent": SEC_USER_AGENT}, timeout=FILING_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            parts = []
+            size = 0
+            for part in response.iter_content(chunk_size=256 * 1024):
+                parts.append(part)
+                size += len(part)
+                if size >= FILING_MAX_BYTES:
+                    logger.info("Rapport tronqué à %d octets : %s", size, url)
+                    break
+            return b"".join(parts)
+
+    with span("filings", "download", host=urlparse(url).netloc) as download_span:
+        content = limited("sec", download)
+        download_span.set(bytes=len(content))
+    soup = make_soup(content)
+    for tag in soup.find_all(HIDDEN_TAGS):
+        tag.decompose()
+    return " ".join(soup.get_text(" ").split())
+
+
+def split_chunks(text, words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Passages de words mots ; chacun reprend les overlap derniers mots du précédent."""
+    tokens = text.split()
+    step = words - overlap
+    return [" ".join(tokens[start:start + words]) for start in range(0, max(len(tokens) - overlap, 1), step)]
+
+
+def get_index(ticker):
+    """Index du ticker en mémoire, sinon relu depuis le disque ; None s'il n'a jamais été construit."""
+    with _lock:
+        index = _indexes.get(ticker)
+    if index is None and os.path.exists(index_path(ticker)):
+        try:
+            index = FilingsIndex.load(index_path(ticker))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Index des rapports illisible (%s) : %s", ticker, e)
+            return None
+        with _lock:
+            index = _indexes.setdefault(ticker, index)
+    return index
+
+
+def is_stale(index, max_age=FILINGS_INDEX_MAX_AGE):
+    return index is None or index.updated is None or time.time() - index.updated >= max_age
+
+
+def update_index(ticker, max_age=FILINGS_INDEX_MAX_AGE):
+    """Ajoute à l'index les rapports déposés depuis la dernière mise à jour."""
+    with ticker_lock(ticker):
+        index = get_index(ticker)
+        if not is_stale(index, max_age):
+            return index
+        index = index or FilingsIndex(ticker)
+        known = index.urls()
+        new_documents = [document for document in list_documents(ticker) if document["url"] not in known]
+
+        def parse(document):
+            try:
+                return document, split_chunks(download_text(document["url"]))
+            except Exception as e:
+                # Document ignoré : il sera retenté à la prochaine mise à jour
+                logger.warning("Rapport %s %s indisponible : %s", ticker, document["url"], e)
+                return None
+
+        with span("filings", "index", symbol=ticker, documents=len(new_documents)) as index_span:
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="filing") as executor:
+                parsed = [result for result in executor.map(propagate(parse), new_documents) if result]
+            if parsed:
+                index = index.with_documents(parsed)
+            index.updated = time.time()
+            index.save(index_path(ticker))
+            index_span.set(chunks=len(index))
+        with _lock:
+            _indexes[ticker] = index
+        if parsed:
+            logger.info("Index des rapports %s : +%d document(s), %d passages", ticker, len(parsed), len(index))
+        return index
+
+
+def schedule_update(ticker):
+    """Met à jour l'index en arrière-plan (sans attendre), une seule fois à la fois par ticker."""
+    with _lock:
+        if ticker in _scheduled:
+            return
+        _scheduled.add(ticker)
+
+    def run():
+        try:
+            update_index(ticker)
+        except Exception as e:
+            logger.error("Échec de l'indexation des rapports %s : %s", ticker, e)
+        finally:
+            with _lock:
+                _scheduled.discard(ticker)
+
+    _updater.submit(run)
+
+
+def search(ticker, question, k=FILINGS_TOP_K):
+    """Passages pertinents de l'index existant ; un index absent ou ancien est mis à jour en arrière-plan."""
+    index = get_index(ticker)
+    if is_stale(index):
+        schedule_update(ticker)
+    return index.search(question, k) if index is not None else []
+
+
+def format_passages(passages, max_tokens=FILINGS_CONTEXT_TOKENS):
+    """Passages étiquetés (type, date) dans la limite de max_tokens tokens estimés."""
+    blocks = []
+    budget = max_tokens
+    for passage in passages:
+        block = truncate_tokens(f"[{passage['type']} {passage['date']}] {passage['text']}", budget)
+        if not block:
+            break
+        blocks.append(block)
+        budget -= estimate_tokens(block)
+        if budget <= 0:
+            break
+    return "\n".join(blocks)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for symbol in sys.argv[1:]:
+        built = update_index(symbol, max_age=0)
+        logger.info("%s : %d document(s), %d passages", symbol, len(built.documents), len(built))
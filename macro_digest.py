@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from bedrock_agents import UNAVAILABLE_SECTION, get_macro_news, gat_analyse_macro
+from file_utils import atomic_write
+from scheduler import start_periodic
+
+
+logger = logging.getLogger(__name__)
+
+# Le contexte macro ne dépend pas du ticker : il est calculé une fois par intervalle
+MACRO_DIGEST_INTERVAL = int(os.getenv("MACRO_DIGEST_INTERVAL", "3600"))
+MACRO_DIGEST_PATH = os.getenv("MACRO_DIGEST_PATH", os.path.join(".cache", "macro_digest.json"))
+
+_digest = None
+_digest_lock = threading.Lock()
+_compute_lock = threading.Lock()
+
+
+def compute_macro_digest():
+    output_macro = get_macro_news()  # Macro news context
+    macrotext = gat_analyse_macro(output_macro)  # Analyse macro
+    return {"output_macro": output_macro, "macrotext": macrotext, "timestamp": time.time()}
+
+
+def is_complete(digest):
+    # macrotext finit par la réponse de l'agent : UNAVAILABLE_SECTION si l'appel a échoué
+    sections = (digest["output_macro"], digest["macrotext"])
+    return all(section and UNAVAILABLE_SECTION not in section for section in sections)
+
+
+def save_digest(digest, path=MACRO_DIGEST_PATH):
+    atomic_write(path, lambda f: json.dump(digest, f, ensure_ascii=False))
+
+
+def load_digest(path=MACRO_DIGEST_PATH):
+    global _digest
+    with _digest_lock:
+        if _digest is None and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    _digest = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Digest macro illisible (%s) : %s", path, e)
+        return _digest
+
+
+def is_fresh(digest, max_age=None):
+    max_age = MACRO_DIGEST_INTERVAL if max_age is None else max_age
+    return digest is not None and time.time() - digest["timestamp"] < max_age
+
+
+def refresh_macro_digest():
+    """Recalcule le digest, le garde en mémoire et l'enregistre sur disque."""
+    global _digest
+    digest = compute_macro_digest()
+    if not is_complete(digest):
+        logger.warning("Digest macro incomplet, non enregistré")
+        return digest
+    with _digest_lock:
+        _digest = digest
+    save_digest(digest)
+    logger.info("Digest macro mis à jour")
+    return digest
+
+
+def get_macro_digest(max_age=None):
+    """
+    Retourne le digest macro {output_macro, macrotext, timestamp}.
+    Il n'est recalculé que s'il est absent ou plus vieux que max_age secondes ;
+    des rapports simultanés attendent le même calcul au lieu de le refaire.
+    """
+    digest = load_digest()
+    if is_fresh(digest, max_age):
+        return digest
+    with _compute_lock:
+        digest = load_digest()
+        if is_fresh(digest, max_age):
+            return digest
+        return refresh_macro_digest()
+
+
+def start_macro_digest_scheduler(interval=None):
+    """Lance (une seule fois) le thread qui rafraîchit le digest en arrière-plan."""
+    interval = interval or MACRO_DIGEST_INTERVAL
+
+    def next_refresh():
+        # Réveil à l'expiration du digest, qu'il ait été calculé ici ou par un rapport
+        digest = load_digest()
+        age = time.time() - digest["timestamp"] if digest else interval
+        return max(60, interval - age)
+
+    return start_periodic("macro-digest", next_refresh, lambda: get_macro_digest(max_age=interval))
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import price_store
+from file_utils import atomic_write
+from scheduler import start_periodic
+
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(".cache", "metrics.npz"))
+FUNDAMENTALS_PATH = os.getenv("FUNDAMENTALS_PATH", os.path.join(".cache", "fundamentals.json"))
+FUNDAMENTALS_MAX_AGE = int(os.getenv("FUNDAMENTALS_MAX_AGE", str(24 * 3600)))
+METRICS_INTERVAL = int(os.getenv("METRICS_INTERVAL", "3600"))
+METRICS_PERIOD = "2y"
+BENCHMARK = "^GSPC"
+TRADING_DAYS = 252
+
+# Lignes des états financiers utilisées pour ROA / ROE
+NET_INCOME_ROWS = ["Net Income", "Net Income Common Stockholders"]
+TOTAL_ASSETS_ROWS = ["Total Assets"]
+EQUITY_ROWS = ["Stockholders Equity", "Total Stockholder Equity", "Common Stock Equity"]
+
+MOMENTUM_DAYS = 126  # ~6 mois de bourse
+METRIC_COLUMNS = ["return", "cagr", "r_squared", "volatility", "max_drawdown", "momentum", "roa", "roe"]
+
+_result = None
+_result_lock = threading.Lock()
+_fundamentals_lock = threading.Lock()
+
+
+def ffill(matrix):
+    """Propage la dernière valeur connue de chaque ligne (les NaN initiaux restent NaN)."""
+    n_cols = matrix.shape[1]
+    index = np.where(~np.isnan(matrix), np.arange(n_cols), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return matrix[np.arange(matrix.shape[0])[:, None], index]
+
+
+def price_matrix(symbols, period=METRICS_PERIOD, benchmark=BENCHMARK):
+    """
+    Matrice des cours ajustés (symboles x jours) alignée sur les jours de bourse
+    de l'indice de référence, lue depuis le stockage local des prix.
+    """
+    start = price_store.period_start(period)
+    bench = price_store.read_window(benchmark, start=start, refresh=False)
+    dates = bench["date"]
+    matrix = np.full((len(symbols), len(dates)), np.nan)
+    for row, symbol in enumerate(symbols):
+        window = price_store.read_window(symbol, start=start, refresh=False)
+        if len(window) == 0 or len(dates) == 0:
+            continue
+        position = np.searchsorted(dates, window["date"])
+        valid = (position < len(dates))
+        valid[valid] = dates[position[valid]] == window["date"][valid]
+        matrix[row, position[valid]] = window["adj_close"][valid]
+    return dates, ffill(matrix), np.asarray(bench["adj_close"], dtype="f8")
+
+
+def price_metrics(dates, matrix, bench):
+    """
+    Rendement, CAGR, R² contre l'indice, volatilité annualisée, perte maximale
+    et momentum (rendement sur 6 mois) pour toutes les lignes de la matrice
+    en une seule passe.
+    """
+    n_rows = matrix.shape[0]
+    empty = {name: np.full(n_rows, np.nan) for name in ["return", "cagr", "r_squared", "volatility", "max_drawdown", "momentum"]}
+    if matrix.shape[1] < 2:
+        return empty
+
+    rows = np.arange(n_rows)
+    first = np.argmax(~np.isnan(matrix), axis=1)
+    first_price = matrix[rows, first]
+    last_price = matrix[:, -1]
+    total_return = last_price / first_price - 1
+    years = (dates[-1] - dates[first]).astype("timedelta64[D]").astype("f8") / 365.25
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = np.where(years > 0, (1 + total_return) ** (1 / years) - 1, np.nan)
+
+        returns = np.diff(np.log(matrix), axis=1)
+        bench_returns = np.diff(np.log(bench))
+        mask = ~np.isnan(returns) & ~np.isnan(bench_returns)
+        count = mask.sum(axis=1)
+        r = np.where(mask, returns, 0.0)
+        b = np.where(mask, bench_returns, 0.0)
+        mean_r = r.sum(axis=1) / count
+        mean_b = b.sum(axis=1) / count
+        cov = (r * b).sum(axis=1) / count - mean_r * mean_b
+        var_r = (r * r).sum(axis=1) / count - mean_r ** 2
+        var_b = (b * b).sum(axis=1) / count - mean_b ** 2
+        r_squared = cov ** 2 / (var_r * var_b)
+        volatility = np.sqrt(var_r * TRADING_DAYS)
+
+        momentum = last_price / matrix[:, max(0, matrix.shape[1] - 1 - MOMENTUM_DAYS)] - 1
+
+        running_max = np.fmax.accumulate(matrix, axis=1)
+        max_drawdown = np.fmin.reduce(matrix / running_max - 1, axis=1)
+
+    return {
+        "return": total_return * 100,
+        "cagr": cagr * 100,
+        "r_squared": r_squared,
+        "volatility": volatility * 100,
+        "max_drawdown": max_drawdown * 100,
+        "momentum": momentum * 100,
+    }
+
+
+def first_row(frame, names):
+    if frame is None or frame.empty:
+        return np.nan
+    for name in names:
+        if name in frame.index:
+            value = frame.loc[name].dropna()
+            if not value.empty:
+                return float(value.iloc[0])
+    return np.nan
+
+
+def fetch_fundamentals(symbol):
+    from chart_utils import get_snapshot
+
+    snapshot = get_snapshot(price_store.yf_symbol(symbol))
+    financials = snapshot.financials
+    balance_sheet = snapshot.balance_sheet
+    return {
+        "net_income": first_row(financials, NET_INCOME_ROWS),
+        "total_assets": first_row(balance_sheet, TOTAL_ASSETS_ROWS),
+        "total_equity": first_row(balance_sheet, EQUITY_ROWS),
+        "timestamp": time.time(),
+    }
+
+
+def load_fundamentals():
+    try:
+        with open(FUNDAMENTALS_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def refresh_fundamentals(symbols, max_age=FUNDAMENTALS_MAX_AGE, max_workers=8):
+    """Télécharge les états financiers manquants ou périmés, et seulement ceux-là."""
+    with _fundamentals_lock:
+        fundamentals = load_fundamentals()
+    stale = [s for s in symbols if time.time() - fundamentals.get(s, {}).get("timestamp", 0) > max_age]
+    if not stale:
+        return fundamentals
+
+    def fetch(symbol):
+        try:
+            return symbol, fetch_fundamentals(symbol)
+        except Exception as e:
+            logger.warning("États financiers indisponibles pour %s : %s", symbol, e)
+            return symbol, None
+
+    # Téléchargement hors du verrou : le calcul d'un seul ticker n'attend pas celui de l'univers
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fundamentals") as executor:
+        fetched = {symbol: values for symbol, values in executor.map(fetch, stale) if values is not None}
+
+    with _fundamentals_lock:
+        # Relu : un autre rafraîchissement a pu enregistrer d'autres symboles entre-temps
+        fundamentals = load_fundamentals()
+        fundamentals.update(fetched)
+        atomic_write(FUNDAMENTALS_PATH, lambda f: json.dump(fundamentals, f))
+    return fundamentals
+
+
+def fundamental_metrics(symbols, fundamentals):
+    def column(name):
+        return np.array([fundamentals.get(s, {}).get(name, np.nan) for s in symbols], dtype="f8")
+
+    net_income = column("net_income")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "roa": net_income / column("total_assets") * 100,
+            "roe": net_income / column("total_equity"),
+        }
+
+
+def compute_metrics(symbols, fundamentals=None):
+    """
+    Calcule toutes les métriques pour la liste de symboles.
+
+    Returns:
+        dict: "symbols" (ndarray) et un ndarray par métrique de METRIC_COLUMNS,
+        dans l'ordre des symboles.
+    """
+    symbols = list(symbols)
+    dates, matrix, bench = price_matrix(symbols)
+    result = {"symbols": np.array(symbols)}
+    result.update(price_metrics(dates, matrix, bench))
+    result.update(fundamental_metrics(symbols, fundamentals if fundamentals is not None else load_fundamentals()))
+    return result
+
+
+def save_metrics(result, path=METRICS_PATH):
+    atomic_write(path, lambda f: np.savez(f, computed=time.time(), **result), "wb")
+
+
+def refresh_universe(symbols):
+    """Synchronise les données puis recalcule et enregistre les métriques de tout l'univers."""
+    symbols = list(symbols)
+    price_store.ensure_fresh(symbols + [BENCHMARK])
+    fundamentals = refresh_fundamentals(symbols)
+    start = time.perf_counter()
+    result = compute_metrics(symbols, fundamentals)
+    logger.info("Métriques de %d symboles calculées en %.2fs", len(symbols), time.perf_counter() - start)
+    save_metrics(result)
+    global _result
+    with _result_lock:
+        _result = dict(result, index={s: i for i, s in enumerate(symbols)})
+    return result
+
+
+def get_metrics():
+    """Dernier résultat calculé (en mémoire ou sur disque), ou None."""
+    global _result
+    with _result_lock:
+        if _result is None and os.path.exists(METRICS_PATH):
+            with np.load(METRICS_PATH) as data:
+                result = {name: data[name] for name in data.files if name != "computed"}
+            _result = dict(result, index={str(s): i for i, s in enumerate(result["symbols"])})
+        return _result
+
+
+def lookup(symbol, metric):
+    """Valeur d'une métrique pour un symbole, ou None si elle n'a pas été calculée."""
+    result = get_metrics()
+    if result is None or symbol not in result["index"] or metric not in result:
+        return None
+    value = result[metric][result["index"][symbol]]
+    return None if np.isnan(value) else float(value)
+
+
+def ticker_metrics(symbol):
+    """Métriques d'un ticker : lues dans le résultat de l'univers, sinon calculées localement."""
+    result = get_metrics()
+    if result is not None and symbol in result["index"]:
+        return {metric: lookup(symbol, metric) for metric in METRIC_COLUMNS}
+    price_store.ensure_fresh([symbol, BENCHMARK])
+    single = compute_metrics([symbol], refresh_fundamentals([symbol]))
+    return {metric: (None if np.isnan(single[metric][0]) else float(single[metric][0])) for metric in METRIC_COLUMNS}
+
+
+def start_metrics_refresh(symbols_fn, interval=METRICS_INTERVAL):
+    """Recalcule périodiquement les métriques de l'univers en arrière-plan."""
+    return start_periodic("metrics", interval, lambda: refresh_universe(symbols_fn()))
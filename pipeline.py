@@ -0,0 +1,99 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from telemetry import span, propagate
+
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximum d'étapes exécutées en même temps (surtout des appels Bedrock)
+DEFAULT_MAX_WORKERS = int(os.getenv("REPORT_MAX_WORKERS", "4"))
+
+
+def check_stages(stages):
+    """
+    Vérifie que chaque dépendance existe et que le graphe ne contient pas de cycle.
+    Retourne les noms des étapes dans un ordre topologique.
+    """
+    for name, (_, deps) in stages.items():
+        for dep in deps:
+            if dep not in stages:
+                raise ValueError(f"Étape '{name}' : dépendance inconnue '{dep}'")
+
+    order = []
+    state = {}  # 1 = en cours de visite, 2 = visitée
+
+    def visit(name):
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError(f"Cycle détecté autour de l'étape '{name}'")
+        state[name] = 1
+        for dep in stages[name][1]:
+            visit(dep)
+        state[name] = 2
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+def run_stages(stages, max_workers=None, on_stage_done=None):
+    """
+    Exécute un graphe d'étapes en parallèle.
+
+    Parameters:
+        stages (dict): nom -> (fonction, [dépendances]). La fonction reçoit les
+            résultats de ses dépendances en arguments positionnels, dans l'ordre.
+        max_workers (int): nombre d'étapes exécutées simultanément.
+        on_stage_done (callable): appelé avec (nom, durée) à la fin de chaque étape.
+
+    Returns:
+        tuple: (résultats par étape, temps par étape en secondes)
+    """
+    check_stages(stages)
+    max_workers = max_workers or DEFAULT_MAX_WORKERS
+
+    results = {}
+    timings = {}
+    remaining = dict(stages)
+    running = {}
+    t0 = time.perf_counter()
+
+    def timed(name, func, args):
+        start = time.perf_counter()
+        try:
+            with span("stage", name):
+                return func(*args)
+        finally:
+            end = time.perf_counter()
+            timings[name] = {"start": start - t0, "end": end - t0, "duration": end - start}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as executor:
+        while remaining or running:
+            # Lancer toutes les étapes dont les dépendances sont terminées
+            for name, (func, deps) in list(remaining.items()):
+                if all(dep in results for dep in deps):
+                    args = [results[dep] for dep in deps]
+                    # propagate : les spans de l'étape sont rattachés à la trace de l'appelant
+                    running[executor.submit(propagate(timed), name, func, args)] = name
+                    del remaining[name]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    for pending in running:
+                        pending.cancel()
+                    logger.error("Étape '%s' en échec : %s", name, error)
+                    raise error
+                results[name] = future.result()
+                logger.info("Étape '%s' terminée en %.2fs", name, timings[name]["duration"])
+                if on_stage_done is not None:
+                    on_stage_done(name, timings[name]["duration"])
+
+    return results, timings
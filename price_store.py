@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import logging
+import threading
+from urllib.parse import quote
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from telemetry import span
+from rate_limit import limited
+from file_utils import atomic_write
+from scheduler import start_periodic
+
+
+logger = logging.getLogger(__name__)
+
+# Historique OHLCV local : un fichier .npy par symbole, lu en mémoire mappée
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join(".cache", "prices"))
+PRICE_STORE_START_PERIOD = os.getenv("PRICE_STORE_START_PERIOD", "5y")  # profondeur du premier téléchargement
+PRICE_STORE_MAX_AGE = int(os.getenv("PRICE_STORE_MAX_AGE", "3600"))  # au-delà, une lecture déclenche une synchro
+PRICE_STORE_BATCH_SIZE = 100
+
+MACRO_SYMBOLS = ["^GSPC", "DX-Y.NYB", "^TNX", "GC=F", "CL=F", "^VIX", "^IRX"]
+
+PRICE_DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("adj_close", "f8"),
+    ("volume", "f8"),
+])
+FRAME_COLUMNS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "adj_close": "Adj Close", "volume": "Volume"}
+
+_lock = threading.Lock()
+_symbol_locks = {}
+_meta = None  # symbole -> date de la dernière synchro (timestamp)
+
+
+def yf_symbol(symbol):
+    # Wikipedia écrit BRK.B, yfinance attend BRK-B
+    return symbol.replace(".", "-")
+
+
+def symbol_path(symbol):
+    return os.path.join(PRICE_STORE_DIR, quote(symbol, safe="") + ".npy")
+
+
+def meta_path():
+    return os.path.join(PRICE_STORE_DIR, "_sync.json")
+
+
+def load_meta():
+    global _meta
+    if _meta is None:
+        try:
+            with open(meta_path(), encoding="utf-8") as f:
+                _meta = json.load(f)
+        except (OSError, ValueError):
+            _meta = {}
+    return _meta
+
+
+def save_meta():
+    atomic_write(meta_path(), lambda f: json.dump(_meta, f))
+
+
+def symbol_lock(symbol):
+    with _lock:
+        return _symbol_locks.setdefault(symbol, threading.Lock())
+
+
+def period_start(period, today=None):
+    """Date de début d'une période yfinance ("5d", "1mo", "2y", "max")."""
+    today = today or date.today()
+    if period == "max":
+        return None
+    units = {"d": 1, "wk": 7, "mo": 31, "y": 366}
+    for unit, days in units.items():
+        if period.endswith(unit) and period[:-len(unit)].isdigit():
+            return today - timedelta(days=int(period[:-len(unit)]) * days)
+    raise ValueError(f"Période inconnue : {period}")
+
+
+def load(symbol):
+    """Tableau structuré complet du symbole (mémoire mappée, aucune copie)."""
+    path = symbol_path(symbol)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=PRICE_DTYPE)
+    return np.load(path, mmap_mode="r")
+
+
+def write(symbol, array):
+    # Les lecteurs gardent l'ancien fichier mappé jusqu'au remplacement
+    atomic_write(symbol_path(symbol), lambda f: np.save(f, array), "wb")
+
+
+def frame_to_records(frame):
+    frame = frame.dropna(subset=["Close"])
+    records = np.empty(len(frame), dtype=PRICE_DTYPE)
+    index = frame.index
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    records["date"] = index.values.astype("datetime64[D]")
+    for field, column in FRAME_COLUMNS.items():
+        source = column if column in frame.columns else "Close"
+        records[field] = frame[source].to_numpy(dtype="f8")
+    return records
+
+
+def append(symbol, records):
+    """
+    Ajoute au fichier les barres téléchargées. La dernière barre connue est
+    remplacée si elle est re-téléchargée (barre du jour encore incomplète).
+    """
+    if len(records) == 0:
+        return 0
+    with symbol_lock(symbol):
+        existing = load(symbol)
+        kept = existing[existing["date"] < records["date"][0]]
+        write(symbol, np.concatenate([np.asarray(kept), records]))
+        return len(records) - (len(existing) - len(kept))
+
+
+def download(symbols, start=None, period=None):
+    with span("yfinance", "download", symbols=len(symbols), start=str(start) if start else period):
+        data = limited("yfinance", lambda: yf.download(
+            [yf_symbol(symbol) for symbol in symbols],
+            start=start, period=period, interval="1d",
+            group_by="ticker", auto_adjust=False, threads=True, progress=False,
+        ))
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    available = set(data.columns.get_level_values(0))
+    for symbol in symbols:
+        if yf_symbol(symbol) in available:
+            frames[symbol] = data[yf_symbol(symbol)]
+    return frames
+
+
+def sync(symbols):
+    """
+    Met à jour le stockage : seules les barres manquantes sont téléchargées,
+    en requêtes groupées (PRICE_STORE_BATCH_SIZE symboles) par date de départ.
+    """
+    by_start = {}
+    for symbol in dict.fromkeys(symbols):
+        existing = load(symbol)
+        start = None
+        if len(existing):
+            # On repart de la dernière barre connue pour compléter la barre du jour
+            start = existing["date"][-1].astype(date)
+        by_start.setdefault(start, []).append(symbol)
+
+    added = 0
+    synced = []
+    for start, group in by_start.items():
+        for i in range(0, len(group), PRICE_STORE_BATCH_SIZE):
+            batch = group[i:i + PRICE_STORE_BATCH_SIZE]
+            try:
+                frames = download(batch, start=start, period=None if start else PRICE_STORE_START_PERIOD)
+            except Exception as e:
+                logger.error("Échec de la synchro des prix (%d symboles) : %s", len(batch), e)
+                continue
+            for symbol, frame in frames.items():
+                added += append(symbol, frame_to_records(frame))
+                synced.append(symbol)
+
+    # Seuls les symboles reçus sont à jour : les autres seront retentés par ensure_fresh
+    now = time.time()
+    with _lock:
+        meta = load_meta()
+        for symbol in synced:
+            meta[symbol] = now
+        save_meta()
+    missing = sum(len(group) for group in by_start.values()) - len(synced)
+    if missing:
+        logger.warning("Synchro des prix : %d symbole(s) sans données, retentés à la prochaine lecture", missing)
+    logger.info("Synchro des prix : %d symboles, %d barres ajoutées", len(synced), added)
+    return added
+
+
+def ensure_fresh(symbols):
+    with _lock:
+        meta = load_meta()
+        stale = [symbol for symbol in symbols if time.time() - meta.get(symbol, 0) > PRICE_STORE_MAX_AGE]
+    if stale:
+        sync(stale)
+
+
+def read_window(symbol, start=None, end=None, refresh=True):
+    """
+    Barres du symbole entre start et end (dates incluses), sous forme de vue
+    sur le fichier mappé : aucune copie des données.
+    """
+    if refresh:
+        ensure_fresh([symbol])
+    array = load(symbol)
+    dates = array["date"]
+    i = 0 if start is None else np.searchsorted(dates, np.datetime64(start, "D"), side="left")
+    j = len(array) if end is None else np.searchsorted(dates, np.datetime64(end, "D"), side="right")
+    return array[i:j]
+
+
+def read_frame(symbol, period="2y", refresh=True):
+    """Fenêtre de la période au format DataFrame (colonnes Open, High, Low, Close, Adj Close, Volume)."""
+    window = read_window(symbol, start=period_start(period), refresh=refresh)
+    frame = pd.DataFrame({column: window[field] for field, column in FRAME_COLUMNS.items()})
+    frame.index = pd.DatetimeIndex(window["date"], name="Date")
+    return frame
+
+
+def start_price_sync(symbols_fn, interval=PRICE_STORE_MAX_AGE):
+    """Synchronise périodiquement les symboles retournés par symbols_fn() en arrière-plan."""
+    return start_periodic("price-sync", interval, lambda: sync(list(symbols_fn()) + MACRO_SYMBOLS))
+
+
+if __name__ == "__main__":
+    from chart_utils import fetch_sp500_tickers
+
+    logging.basicConfig(level=logging.INFO)
+    sync(fetch_sp500_tickers() + MACRO_SYMBOLS)
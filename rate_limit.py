@@ -0,0 +1,247 @@
+import os
+import time
+import random
+import logging
+import threading
+
+import requests
+from botocore.exceptions import ConnectionError as BotocoreConnectionError, HTTPClientError
+
+from telemetry import span
+
+
+logger = logging.getLogger(__name__)
+
+# Débit maximal (requêtes par seconde) de chaque API, partagé par tous les appelants du processus.
+# Après une erreur de limitation le débit est divisé par deux, puis il remonte à chaque succès.
+RATE_LIMITS = {
+    "invoke_model": float(os.getenv("BEDROCK_MODEL_RATE", "5")),
+    "invoke_agent": float(os.getenv("BEDROCK_AGENT_RATE", "10")),
+    "yfinance": float(os.getenv("YFINANCE_RATE", "5")),
+    # Par site d'actualité : le nombre de téléchargements simultanés (ARTICLE_PER_HOST) borne déjà
+    # la charge ; ce débit ne sert qu'à ralentir un site qui répond 429
+    "news": float(os.getenv("NEWS_HOST_RATE", "20")),
+    "sec": float(os.getenv("SEC_RATE", "5")),  # sec.gov tolère 10 requêtes/s
+}
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+# Un article en retard est abandonné plutôt que d'attendre : moins de tentatives pour les sites d'actualité
+MAX_ATTEMPTS = {"news": 2}
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))  # échecs consécutifs avant ouverture
+CIRCUIT_RESET = float(os.getenv("CIRCUIT_RESET", "30"))  # durée d'ouverture (s)
+
+MIN_RATE_FACTOR = 0.05  # le débit adaptatif ne descend pas sous 5 % du débit configuré
+RECOVERY_FACTOR = 0.05  # part du débit configuré regagnée à chaque succès
+
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException", "429"}
+TRANSIENT_CODES = {
+    "ServiceUnavailableException", "InternalServerException", "ModelTimeoutException",
+    "ModelNotReadyException", "500", "502", "503", "504",
+}
+THROTTLING_ERRORS = {"YFRateLimitError"}  # yfinance, comparé par nom : classe absente des anciennes versions
+
+
+class CircuitOpenError(Exception):
+    """L'API est en panne : l'appel est refusé sans être tenté jusqu'à la fin de l'ouverture."""
+
+
+def error_code(error):
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    status = getattr(response, "status_code", None)
+    return str(status) if status is not None else None
+
+
+def is_throttling(error):
+    return type(error).__name__ in THROTTLING_ERRORS or error_code(error) in THROTTLING_CODES
+
+
+def is_transient(error):
+    """Erreur passagère (réseau, service indisponible) qui mérite une nouvelle tentative."""
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError, requests.ConnectionError, requests.Timeout, TimeoutError)):
+        return True
+    return error_code(error) in TRANSIENT_CODES
+
+
+class TokenBucket:
+    """Seau à jetons au débit adaptatif : divisé par deux sur limitation, remonte à chaque succès."""
+
+    def __init__(self, rate, burst=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Bloque jusqu'à obtenir un jeton ; retourne le temps d'attente."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def throttled(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.max_rate * MIN_RATE_FACTOR, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FACTOR)
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur : après failures échecs consécutifs (pannes, pas limitations), les
+    appels sont refusés pendant reset secondes, puis un seul appel test est autorisé.
+    """
+
+    def __init__(self, failures=CIRCUIT_FAILURES, reset=CIRCUIT_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.count = 0
+        self.opened = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return "fermé"
+        return "semi-ouvert" if time.monotonic() - self.opened >= self.reset else "ouvert"
+
+    def check(self, name):
+        with self._lock:
+            if self.opened is None:
+                return
+            if time.monotonic() - self.opened < self.reset or self.probing:
+                raise CircuitOpenError(f"{name} : circuit ouvert après {self.count} échecs")
+            self.probing = True
+
+    def succeeded(self):
+        with self._lock:
+            self.count = 0
+            self.opened = None
+            self.probing = False
+
+    def failed(self):
+        with self._lock:
+            self.count += 1
+            self.probing = False
+            if self.opened is not None or self.count >= self.failures:
+                self.opened = time.monotonic()
+
+    def release(self):
+        """Appel abandonné sans résultat : un autre appel pourra tester l'API."""
+        with self._lock:
+            self.probing = False
+
+
+class RateLimiter:
+    """Débit, nouvelles tentatives (backoff exponentiel avec jitter) et disjoncteur d'une API."""
+
+    def __init__(self, name, rate, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.name = name
+        self.bucket = TokenBucket(rate)
+        self.breaker = CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def acquire(self):
+        """À appeler avant chaque tentative ; lève CircuitOpenError si l'API est en panne."""
+        self.breaker.check(self.name)
+        return self.bucket.acquire()
+
+    def succeeded(self):
+        self.bucket.succeeded()
+        self.breaker.succeeded()
+
+    def failed(self, error, attempt):
+        """
+        Enregistre l'échec de la tentative attempt (à partir de 1) et attend avant la suivante.
+        Retourne False si l'erreur ne doit pas être retentée.
+        """
+        throttling = is_throttling(error)
+        if throttling:
+            # Limitée mais pas en panne : on ralentit sans compter d'échec
+            self.bucket.throttled()
+            self.breaker.succeeded()
+        elif is_transient(error):
+            self.breaker.failed()
+        else:
+            # Erreur de la requête elle-même : l'API a répondu, elle n'est pas en panne
+            self.breaker.succeeded()
+            return False
+        if attempt >= self.max_attempts or self.breaker.opened is not None:
+            return False
+        # Full jitter : les appelants limités en même temps ne réessaient pas ensemble
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        with span("retry", self.name, attempt=attempt, delay=round(delay, 3), throttling=throttling):
+            logger.info("%s : nouvelle tentative dans %.2fs (%s)", self.name, delay, error)
+            time.sleep(delay)
+        return True
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not self.failed(e, attempt):
+                    raise
+                continue
+            self.succeeded()
+            return result
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name, key=None):
+    """Limiteur partagé de l'API name (un par clé, par exemple par site pour "news")."""
+    full_name = f"{name}:{key}" if key else name
+    with _limiters_lock:
+        if full_name not in _limiters:
+            _limiters[full_name] = RateLimiter(full_name, RATE_LIMITS[name], MAX_ATTEMPTS.get(name, RETRY_MAX_ATTEMPTS))
+        return _limiters[full_name]
+
+
+def limited(name, func, *args, key=None, **kwargs):
+    """Appelle func sous le limiteur de l'API name."""
+    return get_limiter(name, key).call(func, *args, **kwargs)
+
+
+def limiter_states():
+    """Débit courant et état du disjoncteur de chaque limiteur (Diagnostics)."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [
+        {
+            "api": limiter.name,
+            "débit (req/s)": round(limiter.bucket.rate, 2),
+            "débit max (req/s)": limiter.bucket.max_rate,
+            "disjoncteur": limiter.breaker.state,
+            "échecs": limiter.breaker.count,
+        }
+        for limiter in limiters
+    ]
@@ -0,0 +1,95 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+from reportpdf import download_report, report_stages
+
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_RETENTION = int(os.getenv("REPORT_JOB_RETENTION", str(6 * 3600)))  # durée de conservation des PDF
+
+PENDING = "en attente"
+RUNNING = "en cours"
+DONE = "terminé"
+FAILED = "échec"
+
+
+class ReportJob:
+    """Génération d'un rapport en arrière-plan et son avancement."""
+
+    def __init__(self, ticker, day):
+        self.id = str(uuid.uuid4())
+        self.ticker = ticker
+        self.day = day
+        self.status = PENDING
+        self.stages_done = {}  # étape -> durée (s)
+        self.total_stages = len(report_stages(ticker)) + 1  # + construction du PDF
+        self.pdf = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def progress(self):
+        return min(len(self.stages_done) / self.total_stages, 1.0)
+
+    def stage_done(self, name, duration):
+        self.stages_done[name] = duration
+
+
+class ReportJobManager:
+    """
+    File de génération de rapports : submit() retourne immédiatement un
+    identifiant, un pool borné exécute download_report. Une demande identique
+    (même ticker, même jour) réutilise le job existant, en cours ou terminé.
+    """
+
+    def __init__(self, max_workers=REPORT_JOB_WORKERS, retention=REPORT_JOB_RETENTION):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._jobs = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def submit(self, ticker):
+        key = (ticker, date.today().isoformat())
+        with self._lock:
+            self._cleanup()
+            job = self._jobs.get(self._by_key.get(key))
+            if job is not None and job.status != FAILED:
+                return job.id
+            job = ReportJob(ticker, key[1])
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = RUNNING
+        try:
+            job.pdf = download_report(job.ticker, on_stage_done=job.stage_done).getvalue()
+            job.status = DONE
+        except Exception as e:
+            logger.error("Échec du rapport %s : %s", job.ticker, e)
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+
+    def _cleanup(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.retention:
+                del self._jobs[job_id]
+                if self._by_key.get((job.ticker, job.day)) == job_id:
+                    del self._by_key[(job.ticker, job.day)]
@@ -5,27 +5,42 @@ from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
-import matplotlib.pyplot as plt
-import tempfile
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+import sys
+import time
+import logging
+import threading
+from datetime import date
 from io import BytesIO
 
 from bedrock_agents import *
+from pipeline import run_stages
+from macro_digest import get_macro_digest
+import price_store
+from telemetry import span, trace
+from rate_limit import limited
 
 
+logger = logging.getLogger(__name__)
 
 
-def download_report(selected_ticker):
+def download_report(selected_ticker, on_stage_done=None):
     buffer = BytesIO()
-    create_pdf(buffer, selected_ticker)
+    # Une trace par rapport : toutes les étapes et appels y sont rattachés
+    with trace("rapport", ticker=selected_ticker):
+        create_pdf(buffer, selected_ticker, on_stage_done=on_stage_done)
     buffer.seek(0)
     return buffer
 
 #  données financières de l'entreprise
 def get_company_financials(ticker_symbol):
     ticker = yf.Ticker(ticker_symbol)
-    income_statement = ticker.financials  # Compte de résultat
-    balance_sheet = ticker.balance_sheet  # Bilan
-    cashflow_statement = ticker.cashflow  # Flux de trésorerie
+    with span("yfinance", "statements", symbol=ticker_symbol):
+        income_statement = limited("yfinance", lambda: ticker.financials)  # Compte de résultat
+        balance_sheet = limited("yfinance", lambda: ticker.balance_sheet)  # Bilan
+        cashflow_statement = limited("yfinance", lambda: ticker.cashflow)  # Flux de trésorerie
     return income_statement, balance_sheet, cashflow_statement
 
 def df_to_table(dataframe):
@@ -40,53 +55,91 @@ def df_to_table(dataframe):
 
 
 
+# Graphiques rendus en mémoire (PNG) et mis en cache par (symbole, période, jour) :
+# les graphiques ^IRX et ^VIX sont les mêmes pour tous les tickers
+_chart_cache = {}
+_chart_key_locks = {}
+_chart_lock = threading.Lock()
+
+
+def render_line_chart(data, color, label, title, xlabel, ylabel):
+    # Figure sans pyplot : le rendu peut se faire hors du thread principal
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
+    ax.plot(data.index, data["Close"], color=color, label=label)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.legend()
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def cached_chart(symbol, period, render):
+    key = (symbol, period, date.today())
+    with _chart_lock:
+        key_lock = _chart_key_locks.setdefault(key, threading.Lock())
+    # Un seul rendu par clé, même si plusieurs rapports la demandent en même temps
+    with key_lock:
+        with _chart_lock:
+            if key in _chart_cache:
+                return _chart_cache[key]
+        with span("chart", "render", symbol=symbol, period=period) as chart_span:
+            png = render()
+            chart_span.set(bytes=len(png))
+        with _chart_lock:
+            # On ne garde que les graphiques du jour
+            for old_key in [k for k in _chart_key_locks if k[2] != key[2]]:
+                _chart_cache.pop(old_key, None)
+                del _chart_key_locks[old_key]
+            _chart_cache[key] = png
+        return png
+
+
+def shared_charts():
+    """Graphiques du jour communs à tous les rapports ((symbole, période, jour) -> PNG)."""
+    create_inflation_chart()
+    create_vix_chart()
+    with _chart_lock:
+        return {key: png for key, png in _chart_cache.items() if key[0] in ("^IRX", "^VIX")}
+
+
+def preload_charts(charts):
+    # Graphiques rendus par un autre processus (voir batch_reports)
+    with _chart_lock:
+        for key, png in charts.items():
+            _chart_key_locks.setdefault(key, threading.Lock())
+            _chart_cache[key] = png
+
+
 # graphique d'inflation
 def create_inflation_chart():
-    fig, ax = plt.subplots(figsize=(6, 4))
-    data = yf.download("^IRX", period="1mo", interval="1d")
-    ax.plot(data.index, data["Close"], color="blue", label="Taux à 10 ans")
-    ax.set_title("Graphique de l'inflation (proxy)")
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Taux")
-    ax.legend()
-    temp_file = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-    fig.savefig(temp_file.name, format="png")
-    plt.close(fig)
-    return temp_file.name
+    return cached_chart("^IRX", "1mo", lambda: render_line_chart(
+        price_store.read_frame("^IRX", "1mo"),
+        "blue", "Taux à 10 ans", "Graphique de l'inflation (proxy)", "Date", "Taux",
+    ))
 
 # graphique du VIX
 def create_vix_chart():
-    fig, ax = plt.subplots(figsize=(6, 4))
-    vix_data = yf.download("^VIX", period="1mo", interval="1d")
-    ax.plot(vix_data.index, vix_data["Close"], color="red", label="VIX")
-    ax.set_title("Graphique du VIX sur 1 mois")
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Volatilité")
-    ax.legend()
-    temp_file = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-    fig.savefig(temp_file.name, format="png")
-    plt.close(fig)
-    return temp_file.name
+    return cached_chart("^VIX", "1mo", lambda: render_line_chart(
+        price_store.read_frame("^VIX", "1mo"),
+        "red", "VIX", "Graphique du VIX sur 1 mois", "Date", "Volatilité",
+    ))
 
 
 # graphique des prix de l'action sur 1 mois
 def create_price_chart(ticker_symbol):
-    data = yf.download(ticker_symbol, period="1mo", interval="1d")
-    fig, ax = plt.subplots(figsize=(6, 4))
-    ax.plot(data.index, data["Close"], color="green", label=f"{ticker_symbol} Price")
-    ax.set_title(f"Prix de l'action {ticker_symbol} sur 1 mois")
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Prix de clôture")
-    ax.legend()
-    temp_file = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-    fig.savefig(temp_file.name, format="png")
-    plt.close(fig)
-    return temp_file.name
+    return cached_chart(ticker_symbol, "1mo", lambda: render_line_chart(
+        price_store.read_frame(ticker_symbol, "1mo"),
+        "green", f"{ticker_symbol} Price", f"Prix de l'action {ticker_symbol} sur 1 mois", "Date", "Prix de clôture",
+    ))
 
 # informations de l'entreprise
 def get_ticker_name(ticker_symbol):
     ticker = yf.Ticker(ticker_symbol)
-    info = ticker.info
+    with span("yfinance", "info", symbol=ticker_symbol):
+        info = limited("yfinance", lambda: ticker.info)
     ticker_name = {
         "code": info.get("symbol", "N/A"),
         "ticker": ticker_symbol,
@@ -118,34 +171,77 @@ def footer(canvas, doc):
     canvas.drawRightString(A4[0] - doc.rightMargin, 0.75*inch, f"Page {doc.page}")
 
 def get_company_info(ticker_symbol):
+    """Fiche de l'entreprise ; si yfinance ne répond pas, la description devient UNAVAILABLE_SECTION."""
     ticker = yf.Ticker(ticker_symbol)
-    info = ticker.info
-    company_info = {
-        "code": info.get("symbol", "N/A"),
-        "ticker": ticker_symbol,
-        "name": info.get("longName", ticker_symbol),
-        "sector": info.get("sector", "N/A"),
-        "country": info.get("country", "N/A"),
-        "market_cap": f"{info.get('marketCap', 'N/A'):,} USD" if info.get("marketCap") else "N/A",
-        "description": info.get("longBusinessSummary", "Description non disponible.")[:300] + "..."
-    }
+    try:
+        with span("yfinance", "info", symbol=ticker_symbol):
+            info = limited("yfinance", lambda: ticker.info)
+        company_info = {
+            "code": info.get("symbol", "N/A"),
+            "ticker": ticker_symbol,
+            "name": info.get("longName", ticker_symbol),
+            "sector": info.get("sector", "N/A"),
+            "country": info.get("country", "N/A"),
+            "market_cap": f"{info.get('marketCap', 'N/A'):,} USD" if info.get("marketCap") else "N/A",
+            "description": info.get("longBusinessSummary", "Description non disponible.")[:300] + "..."
+        }
+    except Exception as e:
+        logger.error("Informations indisponibles pour %s : %s", ticker_symbol, e)
+        company_info = {"ticker": ticker_symbol, "name": ticker_symbol, "description": UNAVAILABLE_SECTION}
     return company_info
 
+# Étapes du rapport : nom -> (fonction, dépendances), voir pipeline.run_stages
+def report_stages(ticker_name):
+    return {
+        "company_info": (lambda: get_company_info(ticker_name), []),
+        "macro_digest": (get_macro_digest, []),  # Contexte et analyse macro partagés entre rapports
+        "news_sentiment": (lambda: get_news_with_sentiment(ticker_name), []),  # Sentiment new context
+        "profil": (lambda: profil_resp_data(ticker_name), []),
+        "finance": (lambda: finance_resp_data(ticker_name), []),
+        "sentiment": (lambda news: sentiment_anal(ticker_name, news), ["news_sentiment"]),
+        "risk": (lambda digest: risk_anal(ticker_name, digest["output_macro"]), ["macro_digest"]),
+        "holders": (lambda: holders_anal(ticker_name), []),
+        # Les graphiques sont rendus pendant les appels Bedrock
+        "inflation_chart": (create_inflation_chart, []),
+        "vix_chart": (create_vix_chart, []),
+        "price_chart": (lambda: create_price_chart(ticker_name), []),
+        # Compaction de chaque section dès qu'elle est prête, puis synthèse sur un contexte borné
+        "compact_risk": (lambda risk: compact_section("risques", risk), ["risk"]),
+        "compact_profil": (lambda profil: compact_section("profil", profil), ["profil"]),
+        "compact_macro": (lambda digest: compact_section("macro", digest["macrotext"]), ["macro_digest"]),
+        "compact_finance": (lambda fin: compact_section("finance", fin), ["finance"]),
+        "compact_sentiment": (lambda sentiment: compact_section("sentiment", sentiment), ["sentiment"]),
+        "tot": (
+            lambda risk, profil, macro, fin, sentiment: tot_anal(
+                ticker_name,
+                response_risk=risk,
+                response_profil=profil,
+                response_macro=macro,
+                response_fin=fin,
+                response_sent=sentiment,
+            ),
+            ["compact_risk", "compact_profil", "compact_macro", "compact_finance", "compact_sentiment"],
+        ),
+    }
+
 # Créer le PDF complet
-def create_pdf(filename, ticker_name):
-   
-    company_info = get_company_info(ticker_name)
-    output_macro = get_macro_news()  # Macro news context
-    sentiment_output= get_news_with_sentiment(ticker_name) #Sentiment new context
-    
-    macrotext = gat_analyse_macro(output_macro) #Analyse macro
-    profil_rest_data = profil_resp_data(ticker_name)
-    response_fin = finance_resp_data(ticker_name)
-    resp_sentiment_anal = sentiment_anal(ticker_name,sentiment_output)
-    resp_risk_anal = risk_anal(ticker_name,output_macro)
-    resp_holders_anal = holders_anal(ticker_name)
-    
-    resp_tot_anal = tot_anal(ticker_name,macrotext,profil_rest_data,response_fin,resp_risk_anal,resp_holders_anal)
+def create_pdf(filename, ticker_name, max_workers=None, on_stage_done=None):
+    """
+    Construit le rapport PDF. Les agents indépendants sont exécutés en parallèle ;
+    on_stage_done(nom, durée) est appelé après chaque étape puis après "pdf".
+    Retourne le temps passé dans chaque étape.
+    """
+    results, timings = run_stages(report_stages(ticker_name), max_workers=max_workers, on_stage_done=on_stage_done)
+    build_start = time.perf_counter()
+
+    company_info = results["company_info"]
+    macrotext = results["macro_digest"]["macrotext"]
+    profil_rest_data = results["profil"]
+    response_fin = results["finance"]
+    resp_sentiment_anal = results["sentiment"]
+    resp_risk_anal = results["risk"]
+    resp_holders_anal = results["holders"]
+    resp_tot_anal = results["tot"]
     
     doc = SimpleDocTemplate(filename, pagesize=A4, leftMargin=inch, rightMargin=inch, topMargin=1.5*inch, bottomMargin=inch)
     elements = []
@@ -172,11 +268,11 @@ def create_pdf(filename, ticker_name):
     elements.append(Paragraph("<b>Actualités Macroéconomiques:</b>", normal_style))
     elements.append(Paragraph(macrotext, normal_style))
     elements.append(Spacer(1, 12))
-    inflation_chart_path = create_inflation_chart()
-    vix_chart_path = create_vix_chart()
+    inflation_chart = results["inflation_chart"]
+    vix_chart = results["vix_chart"]
     elements.append(Paragraph("Graphiques de l'Inflation et du VIX", heading_style))
     chart_data = [
-        [Image(inflation_chart_path, width=3.5*inch, height=2.5*inch), Image(vix_chart_path, width=3.5*inch, height=2.5*inch)]
+        [Image(BytesIO(inflation_chart), width=3.5*inch, height=2.5*inch), Image(BytesIO(vix_chart), width=3.5*inch, height=2.5*inch)]
     ]
     chart_table = Table(chart_data)
     chart_table.setStyle(TableStyle([('ALIGN', (0, 0), (-1, -1), 'CENTER'), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')]))
@@ -201,16 +297,15 @@ def create_pdf(filename, ticker_name):
 
 
     # États Financiers
-    income_statement, balance_sheet, cashflow_statement = get_company_financials(company_info["ticker"])
     elements.append(Paragraph("3. Analyse des États Financiers", heading_style))
 
     elements.append(Paragraph(response_fin, normal_style))
     elements.append(Spacer(1, 12))  # Espacement après la section
 
     # Ajout du graphique des prix de l'action
-    price_chart_path = create_price_chart(company_info["ticker"])
+    price_chart = results["price_chart"]
     elements.append(Paragraph(f"Évolution du prix de l'action {company_info['ticker']} sur 1 mois", heading_style))
-    elements.append(Image(price_chart_path, width=6*inch, height=4*inch))
+    elements.append(Image(BytesIO(price_chart), width=6*inch, height=4*inch))
     elements.append(Spacer(1, 24))  # Espacement après le graphique
 
 
@@ -266,13 +361,19 @@ def create_pdf(filename, ticker_name):
 
 
     # Créer le PDF
-    doc.build(elements, onFirstPage=create_header(company_info), onLaterPages=footer)
+    with span("pdf", "build", ticker=ticker_name):
+        doc.build(elements, onFirstPage=create_header(company_info), onLaterPages=footer)
+
+    timings["pdf"] = {"duration": time.perf_counter() - build_start}
+    if on_stage_done is not None:
+        on_stage_done("pdf", timings["pdf"]["duration"])
+    return timings
 
 
 
 
 if __name__ == "__main__":
-    
-    ticker = "RTX"
-    ticker_name = get_ticker_name(ticker)
-    create_pdf("rapport_institutionnel_banque.pdf", ticker_name)
+    # Un seul rapport ; pour plusieurs tickers voir batch_reports.py
+    ticker = sys.argv[1] if len(sys.argv) > 1 else "RTX"
+    with trace("rapport", ticker=ticker):
+        create_pdf(f"rapport_{ticker}.pdf", ticker)
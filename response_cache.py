@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.getenv("BEDROCK_CACHE_PATH", os.path.join(".cache", "bedrock_responses.sqlite"))
+CACHE_MAX_BYTES = int(os.getenv("BEDROCK_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+CACHE_BYPASS = os.getenv("BEDROCK_CACHE_BYPASS", "0") == "1"
+
+# Durée de validité (en secondes) par type d'appel ; sert aussi de fenêtre de fraîcheur de la clé
+CACHE_TTL = {
+    "subject_sentiment": 24 * 3600,  # même article, même journée
+    "caption": 24 * 3600,
+    "agent": 6 * 3600,
+    "section_digest": 6 * 3600,  # comme les réponses d'agents qu'il résume
+}
+
+
+def make_key(kind, model, prompt, ttl):
+    """Clé de contenu : type d'appel, modèle / alias, fenêtre de fraîcheur et hash du prompt."""
+    window = int(time.time() // ttl)
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    raw = json.dumps([kind, model, window, prompt_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache disque (SQLite) des réponses Bedrock, borné en taille avec éviction LRU."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, kind TEXT, created REAL, accessed REAL, expires REAL, size INTEGER, value TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key, kind, value, ttl):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, now, now, now + ttl, size, value),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE expires < ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Suppression des entrées les moins récemment utilisées
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def cache_enabled(use_cache=True):
+    return use_cache and not CACHE_BYPASS
+
+
+def lookup(kind, model, prompt):
+    value = get_cache().get(make_key(kind, model, prompt, CACHE_TTL[kind]))
+    if value is not None:
+        logger.info("Réponse %s trouvée dans le cache (%s)", kind, model)
+    return value
+
+
+def store(kind, model, prompt, value):
+    ttl = CACHE_TTL[kind]
+    get_cache().set(make_key(kind, model, prompt, ttl), kind, value, ttl)
+
+
+def cached_response(kind, model, prompt, compute, use_cache=True):
+    """
+    Retourne la réponse en cache pour (kind, model, prompt) ou appelle compute().
+    Les réponses vides (erreurs) ne sont pas mises en cache.
+    """
+    if not cache_enabled(use_cache):
+        return compute()
+
+    value = lookup(kind, model, prompt)
+    if value is not None:
+        return value
+
+    value = compute()
+    if value:
+        store(kind, model, prompt, value)
+    return value
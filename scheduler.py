@@ -0,0 +1,35 @@
+import time
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+_threads = {}
+_lock = threading.Lock()
+
+
+def start_periodic(name, interval, func, retry_delay=None):
+    """
+    Appelle func() en boucle dans un thread démon, lancé une seule fois par nom et par
+    processus. interval : secondes entre deux appels, ou fonction qui retourne ce délai.
+    Après une erreur (journalisée), on attend retry_delay secondes (par défaut interval).
+    """
+    def loop():
+        while True:
+            delay = None
+            try:
+                func()
+            except Exception as e:
+                logger.error("Échec de la tâche de fond %s : %s", name, e)
+                delay = retry_delay
+            if delay is None:
+                delay = interval() if callable(interval) else interval
+            time.sleep(delay)
+
+    with _lock:
+        thread = _threads.get(name)
+        if thread is None:
+            thread = _threads[name] = threading.Thread(target=loop, name=name, daemon=True)
+            thread.start()
+        return thread
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics_engine
+import price_store
+from file_utils import atomic_write
+from scheduler import start_periodic
+
+
+logger = logging.getLogger(__name__)
+
+SCREENER_PATH = os.getenv("SCREENER_PATH", os.path.join(".cache", "screener.npz"))
+SCREENER_INFO_PATH = os.getenv("SCREENER_INFO_PATH", os.path.join(".cache", "screener_info.json"))
+SCREENER_INFO_MAX_AGE = int(os.getenv("SCREENER_INFO_MAX_AGE", str(24 * 3600)))
+SCREENER_INTERVAL = int(os.getenv("SCREENER_INTERVAL", "3600"))
+
+# Colonnes du screener : nom -> libellé affiché
+SCREENER_COLUMNS = {
+    "pe": "PE",
+    "ps": "PS",
+    "beta": "Beta",
+    "esg": "ESG",
+    "roa": "ROA (%)",
+    "roe": "ROE",
+    "dividend_yield": "Rendement du dividende",
+    "momentum": "Momentum 6 mois (%)",
+}
+
+_info_lock = threading.Lock()
+
+
+class ScreenerIndex:
+    """
+    Index en colonnes (un tableau NumPy par métrique) avec, pour chaque colonne,
+    l'ordre de tri et les valeurs triées : un filtre par intervalle se résout
+    par deux recherches dichotomiques, sans parcourir les données.
+    """
+
+    def __init__(self, symbols, columns, built=None):
+        self.symbols = np.asarray(symbols)
+        self.columns = {name: np.asarray(values, dtype="f8") for name, values in columns.items()}
+        self.built = built or time.time()
+        self.order = {}
+        self.sorted_values = {}
+        self.valid_count = {}
+        for name, values in self.columns.items():
+            order = np.argsort(values, kind="stable")  # les NaN sont placés à la fin
+            self.order[name] = order
+            self.sorted_values[name] = values[order]
+            self.valid_count[name] = int((~np.isnan(values)).sum())
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def bounds(self, name):
+        count = self.valid_count[name]
+        if count == 0:
+            return None, None
+        values = self.sorted_values[name]
+        return float(values[0]), float(values[count - 1])
+
+    def range_mask(self, name, low=None, high=None):
+        values = self.sorted_values[name][:self.valid_count[name]]
+        i = 0 if low is None else np.searchsorted(values, low, side="left")
+        j = len(values) if high is None else np.searchsorted(values, high, side="right")
+        mask = np.zeros(len(self.symbols), dtype=bool)
+        mask[self.order[name][i:j]] = True
+        return mask
+
+    def query(self, filters=None, sort_by=None, descending=True, limit=None):
+        """
+        Parameters:
+            filters (dict): colonne -> (min, max), bornes incluses, None pour ouvert.
+            sort_by (str): colonne de tri (les valeurs manquantes en dernier).
+
+        Returns:
+            ndarray: positions des symboles retenus, dans l'ordre demandé.
+        """
+        mask = np.ones(len(self.symbols), dtype=bool)
+        for name, (low, high) in (filters or {}).items():
+            mask &= self.range_mask(name, low, high)
+
+        if sort_by is None:
+            positions = np.flatnonzero(mask)
+        else:
+            valid = self.order[sort_by][:self.valid_count[sort_by]]
+            missing = self.order[sort_by][self.valid_count[sort_by]:]
+            if descending:
+                valid = valid[::-1]
+            ranked = np.concatenate([valid, missing])
+            positions = ranked[mask[ranked]]
+        return positions[:limit] if limit else positions
+
+    def rows(self, positions):
+        return [
+            dict({"symbol": str(self.symbols[p])}, **{name: self.columns[name][p] for name in self.columns})
+            for p in positions
+        ]
+
+    def save(self, path=SCREENER_PATH):
+        atomic_write(path, lambda f: np.savez(f, symbols=self.symbols, built=self.built, **self.columns), "wb")
+
+    @classmethod
+    def load(cls, path=SCREENER_PATH):
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files if name not in ("symbols", "built")}
+            return cls(data["symbols"], columns, float(data["built"]))
+
+
+def fetch_info(symbol):
+    from chart_utils import get_snapshot
+
+    snapshot = get_snapshot(price_store.yf_symbol(symbol))
+    info = snapshot.info
+    try:
+        esg = float(snapshot.sustainability.to_dict()["esgScores"]["totalEsg"])
+    except Exception:
+        esg = np.nan
+    return {
+        "pe": info.get("trailingPE"),
+        "ps": info.get("priceToSalesTrailing12Months"),
+        "beta": info.get("beta"),
+        "dividend_yield": info.get("dividendYield"),
+        "esg": esg,
+        "timestamp": time.time(),
+    }
+
+
+def refresh_info(symbols, max_age=SCREENER_INFO_MAX_AGE, max_workers=8):
+    """Télécharge .info / ESG des symboles manquants ou périmés (en arrière-plan uniquement)."""
+    with _info_lock:
+        try:
+            with open(SCREENER_INFO_PATH, encoding="utf-8") as f:
+                infos = json.load(f)
+        except (OSError, ValueError):
+            infos = {}
+        stale = [s for s in symbols if time.time() - infos.get(s, {}).get("timestamp", 0) > max_age]
+        if not stale:
+            return infos
+
+        def fetch(symbol):
+            try:
+                return symbol, fetch_info(symbol)
+            except Exception as e:
+                logger.warning("Informations indisponibles pour %s : %s", symbol, e)
+                return symbol, None
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="screener") as executor:
+            for symbol, values in executor.map(fetch, stale):
+                if values is not None:
+                    infos[symbol] = values
+
+        atomic_write(SCREENER_INFO_PATH, lambda f: json.dump(infos, f))
+        return infos
+
+
+def build_index(symbols, infos, metrics):
+    symbols = list(symbols)
+
+    def info_column(name):
+        values = [infos.get(s, {}).get(name) for s in symbols]
+        return np.array([np.nan if v is None else v for v in values], dtype="f8")
+
+    def metric_column(name):
+        if metrics is None or name not in metrics:
+            return np.full(len(symbols), np.nan)
+        positions = [metrics["index"].get(s) for s in symbols]
+        return np.array([np.nan if p is None else metrics[name][p] for p in positions], dtype="f8")
+
+    columns = {name: info_column(name) for name in ["pe", "ps", "beta", "esg", "dividend_yield"]}
+    columns.update({name: metric_column(name) for name in ["roa", "roe", "momentum"]})
+    return ScreenerIndex(symbols, {name: columns[name] for name in SCREENER_COLUMNS})
+
+
+def refresh_index(symbols):
+    """Reconstruit et enregistre l'index à partir des informations et des métriques précalculées."""
+    symbols = list(symbols)
+    infos = refresh_info(symbols)
+    index = build_index(symbols, infos, metrics_engine.get_metrics())
+    index.save()
+    logger.info("Index du screener reconstruit (%d symboles)", len(index))
+    return index
+
+
+def start_screener_refresh(symbols_fn, interval=SCREENER_INTERVAL):
+    """Reconstruit périodiquement l'index du screener en arrière-plan."""
+    return start_periodic("screener", interval, lambda: refresh_index(symbols_fn()))
@@ -0,0 +1,325 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import contextvars
+import http.server
+from collections import deque
+from contextlib import contextmanager
+
+from file_utils import atomic_write
+from scheduler import start_periodic
+
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_MAX_TRACES = int(os.getenv("TELEMETRY_MAX_TRACES", "20"))  # traces conservées en mémoire
+TELEMETRY_PROM_PATH = os.getenv("TELEMETRY_PROM_PATH", os.path.join(".cache", "metrics.prom"))
+TELEMETRY_EXPORT_INTERVAL = int(os.getenv("TELEMETRY_EXPORT_INTERVAL", "60"))
+TELEMETRY_HOST = os.getenv("TELEMETRY_HOST", "127.0.0.1")
+TELEMETRY_PORT = int(os.getenv("TELEMETRY_PORT", "0"))  # 0 : pas de point d'accès HTTP /metrics
+
+# Bornes des histogrammes de durée (secondes)
+DURATION_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+# Attributs numériques des spans cumulés en compteurs : attribut -> métrique Prometheus
+COUNTERS = {
+    "input_tokens": ("app_input_tokens_total", "Tokens envoyés aux modèles (estimés pour les agents)"),
+    "output_tokens": ("app_output_tokens_total", "Tokens reçus des modèles (estimés pour les agents)"),
+    "bytes": ("app_bytes_total", "Octets reçus"),
+}
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Une opération chronométrée (appel yfinance, article, Bedrock, graphique...)."""
+
+    def __init__(self, kind, name, attributes=None, trace=None, parent=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.name = name
+        self.attributes = {}
+        self.trace = trace
+        self.parent = parent
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.set(**(attributes or {}))
+
+    def set(self, **attributes):
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def first_chunk(self):
+        """À appeler à la réception du premier morceau d'une réponse en streaming."""
+        if "ttfb" not in self.attributes:
+            self.attributes["ttfb"] = time.perf_counter() - self.start
+
+    def finish(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        self.error = None if error is None else f"{type(error).__name__}: {error}"
+        _registry.record(self)
+        if self.trace is not None:
+            self.trace.add(self)
+
+
+class Trace:
+    """Ensemble des spans d'une opération de bout en bout (par exemple un rapport)."""
+
+    def __init__(self, name, attributes=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self.start
+        self.error = None if error is None else f"{type(error).__name__}: {error}"
+
+    def rows(self):
+        """Spans terminés, triés par date de début (décalages en secondes depuis le début de la trace)."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return [
+            dict({
+                "kind": s.kind,
+                "name": s.name,
+                "start": round(s.start - self.start, 3),
+                "duration": round(s.duration, 3),
+                "thread": s.thread,
+                "parent": s.parent.name if s.parent is not None else None,
+                "error": s.error,
+            }, **s.attributes)
+            for s in spans
+        ]
+
+    def summary(self):
+        """Nombre d'appels, temps cumulé et temps maximum par type de span."""
+        result = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            entry = result.setdefault(s.kind, {"count": 0, "total": 0.0, "max": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["total"] += s.duration
+            entry["max"] = max(entry["max"], s.duration)
+            entry["errors"] += s.error is not None
+        return result
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class Registry:
+    """Agrégats de tous les spans du processus, exportés au format Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.ttfb = {}
+        self.errors = {}
+        self.counters = {}
+
+    def record(self, span):
+        labels = (span.kind, span.name)
+        with self._lock:
+            self.durations.setdefault(labels, Histogram()).observe(span.duration)
+            if "ttfb" in span.attributes:
+                self.ttfb.setdefault(labels, Histogram()).observe(span.attributes["ttfb"])
+            if span.error is not None:
+                self.errors[labels] = self.errors.get(labels, 0) + 1
+            for attribute in COUNTERS:
+                value = span.attributes.get(attribute)
+                if isinstance(value, (int, float)):
+                    key = (attribute,) + labels
+                    self.counters[key] = self.counters.get(key, 0) + value
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            self._histogram_lines(lines, "app_span_duration_seconds", "Durée des opérations instrumentées", self.durations)
+            self._histogram_lines(lines, "app_time_to_first_chunk_seconds", "Délai avant le premier morceau des réponses en streaming", self.ttfb)
+            lines.append("# HELP app_span_errors_total Opérations terminées en erreur")
+            lines.append("# TYPE app_span_errors_total counter")
+            for labels, value in sorted(self.errors.items()):
+                lines.append(f"app_span_errors_total{{{format_labels(labels)}}} {value}")
+            for attribute, (metric, help_text) in COUNTERS.items():
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in sorted(self.counters.items()):
+                    if key[0] == attribute:
+                        lines.append(f"{metric}{{{format_labels(key[1:])}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(lines, metric, help_text, histograms):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, histogram in sorted(histograms.items()):
+            base = format_labels(labels)
+            for bound, count in zip(DURATION_BUCKETS, histogram.buckets):
+                lines.append(f'{metric}_bucket{{{base},le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{base},le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum{{{base}}} {histogram.sum:.6f}")
+            lines.append(f"{metric}_count{{{base}}} {histogram.count}")
+
+
+def format_labels(labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    kind, name = labels
+    return f'kind="{escape(kind)}",name="{escape(name)}"'
+
+
+_registry = Registry()
+_traces = deque(maxlen=TELEMETRY_MAX_TRACES)
+_traces_lock = threading.Lock()
+_export_started = False
+_export_lock = threading.Lock()
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Ouvre une trace : les spans créés dans ce contexte (et les threads lancés via propagate) y sont rattachés."""
+    current = Trace(name, attributes)
+    with _traces_lock:
+        _traces.append(current)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    else:
+        current.finish()
+    finally:
+        _current_trace.reset(token)
+
+
+def start_span(kind, name, **attributes):
+    """Crée un span sans le rendre courant ; l'appelant doit appeler finish() (utile dans un générateur)."""
+    return Span(kind, name, attributes, trace=_current_trace.get(), parent=_current_span.get())
+
+
+@contextmanager
+def span(kind, name, **attributes):
+    """Chronomètre le bloc ; les erreurs sont enregistrées puis propagées."""
+    current = start_span(kind, name, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    else:
+        current.finish()
+    finally:
+        _current_span.reset(token)
+
+
+def propagate(func):
+    """
+    Enveloppe func pour qu'elle s'exécute dans un autre thread (pool) avec la
+    trace et le span courants de l'appelant.
+    """
+    current_trace = _current_trace.get()
+    parent = _current_span.get()
+
+    def run(*args, **kwargs):
+        trace_token = _current_trace.set(current_trace)
+        span_token = _current_span.set(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    return run
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def get_traces():
+    """Traces conservées, de la plus récente à la plus ancienne."""
+    with _traces_lock:
+        return list(reversed(_traces))
+
+
+def get_trace(trace_id):
+    return next((t for t in get_traces() if t.id == trace_id), None)
+
+
+def prometheus_text():
+    return _registry.prometheus_text()
+
+
+def write_prometheus(path=TELEMETRY_PROM_PATH):
+    text = prometheus_text()
+    atomic_write(path, lambda f: f.write(text))
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_telemetry_export(interval=TELEMETRY_EXPORT_INTERVAL, port=TELEMETRY_PORT, host=TELEMETRY_HOST):
+    """
+    Écrit périodiquement les métriques dans TELEMETRY_PROM_PATH (pour le
+    textfile collector de node_exporter) et, si un port est configuré, les
+    sert sur http://host:port/metrics. Ne démarre qu'une fois par processus.
+    """
+    global _export_started
+    with _export_lock:
+        if _export_started:
+            return
+        _export_started = True
+
+    start_periodic("telemetry-export", interval, write_prometheus)
+
+    if port:
+        try:
+            server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            logger.error("Point d'accès /metrics indisponible sur %s:%d : %s", host, port, e)
+            return
+        threading.Thread(target=server.serve_forever, name="telemetry-http", daemon=True).start()
+        logger.info("Métriques Prometheus servies sur http://%s:%d/metrics", host, port)
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+from botocore.exceptions import ReadTimeoutError
+
+import aws_clients
+import bedrock_agents
+import rate_limit
+
+
+class FlakyAgentRuntime:
+    """invoke_agent factice : quelques morceaux, puis coupure du flux si fail_after est donné."""
+
+    def __init__(self, chunks=3, fail_after=None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def invoke_agent(self, agentId, agentAliasId, sessionId, inputText, **kwargs):
+        self.calls += 1
+
+        def completion():
+            for i in range(self.chunks):
+                if self.fail_after is not None and i == self.fail_after:
+                    raise ReadTimeoutError(endpoint_url="https://bedrock-agent-runtime")
+                yield {"chunk": {"bytes": f"partie {i} ".encode("utf-8")}}
+
+        return {"completion": completion(), "sessionId": sessionId}
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    yield rate_limit.get_limiter("invoke_agent")
+    aws_clients.reset_clients()
+
+
+def half_open(breaker):
+    breaker.count = breaker.failures
+    breaker.opened = time.monotonic() - breaker.reset - 1
+
+
+def stream(prompt="question"):
+    return bedrock_agents.stream_agent_with_prompt(prompt, "alias", use_cache=False)
+
+
+def test_probe_failing_mid_stream_reopens_the_breaker(limiter):
+    aws_clients.register_client("bedrock-agent-runtime", FlakyAgentRuntime(fail_after=1))
+    half_open(limiter.breaker)
+
+    with pytest.raises(ReadTimeoutError):
+        list(stream())
+
+    assert not limiter.breaker.probing
+    assert limiter.breaker.state == "ouvert"
+
+    # Une fois Bedrock rétabli, l'appel test suivant passe et referme le disjoncteur
+    aws_clients.register_client("bedrock-agent-runtime", FlakyAgentRuntime())
+    half_open(limiter.breaker)
+    assert "".join(stream()) == "partie 0 partie 1 partie 2 "
+    assert limiter.breaker.state == "fermé"
+    assert not limiter.breaker.probing
+
+
+def test_stream_closed_by_consumer_ends_the_probe(limiter):
+    aws_clients.register_client("bedrock-agent-runtime", FlakyAgentRuntime())
+    half_open(limiter.breaker)
+
+    chunks = stream()
+    assert next(chunks) == "partie 0 "
+    chunks.close()
+
+    assert not limiter.breaker.probing
+    assert limiter.breaker.state == "fermé"
+
+
+def test_call_agent_returns_placeholder_when_stream_breaks(limiter):
+    aws_clients.register_client("bedrock-agent-runtime", FlakyAgentRuntime(fail_after=1))
+
+    assert bedrock_agents.call_agent_with_prompt("question", "alias", use_cache=False) == bedrock_agents.UNAVAILABLE_SECTION
+    assert limiter.breaker.count == 1
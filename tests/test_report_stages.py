@@ -0,0 +1,83 @@
+from io import BytesIO
+
+import pytest
+from matplotlib.figure import Figure
+
+import aws_clients
+import bedrock_agents
+import rate_limit
+import reportpdf
+import response_cache
+from benchmarks.fakes import FakeAgentRuntime, FakeBedrockRuntime
+from rate_limit import CircuitOpenError
+
+
+class DownTicker:
+    """Ticker factice dont chaque donnée échoue comme quand le circuit yfinance est ouvert."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def __getattr__(self, name):
+        raise CircuitOpenError(f"yfinance : circuit ouvert ({self.symbol}.{name})")
+
+
+class DownYFinance:
+    Ticker = DownTicker
+
+
+class MissingOfficersTicker:
+    """Ticker factice dont la fiche ne contient pas companyOfficers."""
+
+    def __init__(self, symbol):
+        self.info = {"symbol": symbol}
+        self.institutional_holders = []
+
+
+def png():
+    figure = Figure(figsize=(1, 1))
+    figure.add_subplot().plot([0, 1])
+    buffer = BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def yf_down(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    monkeypatch.setattr(response_cache, "CACHE_BYPASS", True)
+    for module in (bedrock_agents, reportpdf):
+        monkeypatch.setattr(module, "yf", DownYFinance())
+    agents = FakeAgentRuntime(latency=0, chunks=3, chunk_delay=0)
+    aws_clients.register_client("bedrock-runtime", FakeBedrockRuntime(latency=0))
+    aws_clients.register_client("bedrock-agent-runtime", agents)
+    yield agents
+    aws_clients.reset_clients()
+
+
+def test_yfinance_stages_fall_back_to_placeholder(yf_down):
+    assert reportpdf.get_company_info("AAPL")["description"] == bedrock_agents.UNAVAILABLE_SECTION
+    assert bedrock_agents.get_news_with_sentiment("AAPL") == bedrock_agents.UNAVAILABLE_SECTION
+    assert bedrock_agents.holders_anal("AAPL") == bedrock_agents.UNAVAILABLE_SECTION
+    # Pas d'appel à l'agent sans données
+    assert bedrock_agents.sentiment_anal("AAPL", bedrock_agents.UNAVAILABLE_SECTION) == bedrock_agents.UNAVAILABLE_SECTION
+    assert yf_down.calls == 0
+
+
+def test_missing_key_falls_back_to_placeholder(yf_down, monkeypatch):
+    monkeypatch.setattr(bedrock_agents.yf, "Ticker", MissingOfficersTicker)
+    assert bedrock_agents.holders_anal("AAPL") == bedrock_agents.UNAVAILABLE_SECTION
+
+
+def test_report_builds_when_yfinance_is_down(yf_down, monkeypatch):
+    chart = png()
+    monkeypatch.setattr(reportpdf, "get_macro_digest", lambda: {"macrotext": "Contexte macro.", "output_macro": "Contexte macro."})
+    monkeypatch.setattr(reportpdf, "create_inflation_chart", lambda: chart)
+    monkeypatch.setattr(reportpdf, "create_vix_chart", lambda: chart)
+    monkeypatch.setattr(reportpdf, "create_price_chart", lambda ticker: chart)
+
+    buffer = BytesIO()
+    timings = reportpdf.create_pdf(buffer, "AAPL", max_workers=4)
+
+    assert buffer.getvalue().startswith(b"%PDF")
+    assert "pdf" in timings
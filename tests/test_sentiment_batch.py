@@ -0,0 +1,50 @@
+import io
+import json
+
+import pytest
+
+import aws_clients
+import bedrock_agents
+import rate_limit
+import response_cache
+
+
+class ScriptedBedrockRuntime:
+    """invoke_model factice qui renvoie les textes donnés, un par appel."""
+
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.calls = 0
+
+    def invoke_model(self, modelId, body, **kwargs):
+        text = self.texts[min(self.calls, len(self.texts) - 1)]
+        self.calls += 1
+        payload = {"content": [{"type": "text", "text": text}], "usage": {}}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    entries = {}
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    monkeypatch.setattr(response_cache, "CACHE_BYPASS", False)
+    monkeypatch.setattr(response_cache, "lookup", lambda kind, model, prompt: entries.get((kind, model, prompt)))
+    monkeypatch.setattr(response_cache, "store", lambda kind, model, prompt, value: entries.__setitem__((kind, model, prompt), value))
+    yield entries
+    aws_clients.reset_clients()
+
+
+def test_truncated_reply_is_not_cached(cache):
+    valid = '[{"id": 0, "subject": "Résultats", "sentiment": "positif", "score": 0.5}]'
+    runtime = ScriptedBedrockRuntime('[{"id": 0, "subject": "Résul', valid)
+    aws_clients.register_client("bedrock-runtime", runtime)
+
+    assert bedrock_agents.analyze_subject_sentiment_batch(["article"]) == [None]
+    assert cache == {}
+
+    # L'appel suivant interroge de nouveau le modèle, puis la réponse valide est servie depuis le cache
+    expected = [{"subject": "Résultats", "sentiment": "positif", "score": 0.5}]
+    assert bedrock_agents.analyze_subject_sentiment_batch(["article"]) == expected
+    assert bedrock_agents.analyze_subject_sentiment_batch(["article"]) == expected
+    assert runtime.calls == 2
+    assert len(cache) == 1
@@ -0,0 +1,61 @@
+import re
+import math
+import zlib
+from collections import Counter
+
+import numpy as np
+
+
+# Vectorisation locale par hachage (aucun modèle ni service externe) : mots et paires de
+# mots hachés dans DIMENSIONS colonnes, poids 1 + log(tf), vecteurs normalisés (cosinus = produit scalaire)
+DIMENSIONS = 2 ** 18
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[.'’-][^\W_]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be been by for from has have in is it its of on or that the this to was were will with
+which their they our we not but also may such other any all more than these those
+le la les un une des du de d l et ou en au aux est sont a ont pour par sur dans que qui quoi
+ce cette ces son sa ses leur leurs il elle ils elles on nous vous je tu y ne pas plus
+""".split())
+
+
+def tokenize(text):
+    """Mots en minuscules, sans mots vides ni caractères isolés."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def features(tokens):
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def feature_index(feature):
+    # crc32 : même colonne d'un processus à l'autre (hash() de Python est aléatoire)
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h & (DIMENSIONS - 1), 1.0 if h & 0x80000000 else -1.0
+
+
+def vectorize(text):
+    """
+    Vecteur creux normalisé du texte.
+
+    Returns:
+        tuple: (indices int32 triés, valeurs float32), vides si le texte n'a aucun mot utile.
+    """
+    weights = {}
+    for feature, count in Counter(features(tokenize(text))).items():
+        index, sign = feature_index(feature)
+        # Le signe limite le biais des collisions de hachage
+        weights[index] = weights.get(index, 0.0) + sign * (1 + math.log(count))
+    weights = {index: value for index, value in weights.items() if value}
+    if not weights:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    indices = np.fromiter(sorted(weights), dtype=np.int32, count=len(weights))
+    values = np.array([weights[index] for index in indices], dtype=np.float32)
+    return indices, values / np.linalg.norm(values)
+
+
+def to_dense(indices, values, weights=None):
+    """Vecteur dense normalisé (weights : pondération par colonne, par exemple l'IDF)."""
+    dense = np.zeros(DIMENSIONS, dtype=np.float32)
+    dense[indices] = values if weights is None else values * weights[indices]
+    norm = np.linalg.norm(dense)
+    return dense / norm if norm else dense